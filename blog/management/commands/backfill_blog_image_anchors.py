@@ -1,6 +1,8 @@
 import re
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
 
 from blog.models import BlogPost, BlogPostImage
 
@@ -30,9 +32,13 @@ ANCHORS = {
 }
 
 FILE_PATTERNS = {
-    "lizing-kredit-ili-pokupka-za-svoi-2026": r"lizing-kredit_(\d+)_",
-    "servis-ili-sam-sebe-master-kakie-raboty-po-kitayskim-gruzovikam-luchshe-ne-delat-bez-kvalifikatsii": r"sam-sebe-master_(\d+)_",
-    "utechka-vozduha-i-padaet-davlenie-diagnostika-pnevmosistemy": r"utechka-vozduha_(\d+)_",
+    "lizing-kredit-ili-pokupka-za-svoi-2026": re.compile(r"lizing-kredit_(\d+)_", re.IGNORECASE),
+    "servis-ili-sam-sebe-master-kakie-raboty-po-kitayskim-gruzovikam-luchshe-ne-delat-bez-kvalifikatsii": re.compile(
+        r"sam-sebe-master_(\d+)_", re.IGNORECASE
+    ),
+    "utechka-vozduha-i-padaet-davlenie-diagnostika-pnevmosistemy": re.compile(
+        r"utechka-vozduha_(\d+)_", re.IGNORECASE
+    ),
 }
 
 
@@ -57,53 +63,70 @@ class Command(BaseCommand):
         updated = 0
         skipped = 0
 
-        for slug in slugs:
-            if slug not in ANCHORS:
-                self.stdout.write(f"Skipped (unknown slug): {slug}")
-                continue
-
-            mapping = ANCHORS[slug]
-            post = BlogPost.objects.filter(slug=slug).first()
-            if not post:
-                self.stdout.write(f"Post not found: {slug}")
-                continue
-
-            images = list(post.images.order_by("sort_order", "id"))
-            if not images:
-                self.stdout.write(f"No images for: {slug}")
-                continue
-
-            pattern = FILE_PATTERNS.get(slug)
-            for img in images:
-                caption = (img.caption or "").strip()
-                if "@after:" in caption:
-                    skipped += 1
+        posts_by_slug = {
+            post.slug: post
+            for post in BlogPost.objects.filter(slug__in=slugs).prefetch_related(
+                Prefetch(
+                    "images",
+                    queryset=BlogPostImage.objects.order_by("sort_order", "id"),
+                    to_attr="ordered_images",
+                )
+            )
+        }
+
+        with transaction.atomic():
+            for slug in slugs:
+                if slug not in ANCHORS:
+                    self.stdout.write(f"Skipped (unknown slug): {slug}")
                     continue
 
-                file_name = (img.image.name or "").split("/")[-1]
-                match = re.search(pattern, file_name, flags=re.IGNORECASE) if pattern else None
-                if not match:
-                    skipped += 1
-                    continue
-                index = int(match.group(1))
-                anchor = mapping.get(index)
-                if not anchor:
-                    skipped += 1
+                mapping = ANCHORS[slug]
+                post = posts_by_slug.get(slug)
+                if not post:
+                    self.stdout.write(f"Post not found: {slug}")
                     continue
 
-                new_caption = f"@after: {anchor}"
-                if caption:
-                    new_caption = f"{new_caption} | {caption}"
+                images = post.ordered_images
+                if not images:
+                    self.stdout.write(f"No images for: {slug}")
+                    continue
 
-                if dry_run:
-                    self.stdout.write(f"[DRY RUN] {slug}: {file_name} -> {new_caption}")
+                pattern = FILE_PATTERNS.get(slug)
+                to_update = []
+                for img in images:
+                    caption = (img.caption or "").strip()
+                    if "@after:" in caption:
+                        skipped += 1
+                        continue
+
+                    file_name = (img.image.name or "").split("/")[-1]
+                    match = pattern.search(file_name) if pattern else None
+                    if not match:
+                        skipped += 1
+                        continue
+                    index = int(match.group(1))
+                    anchor = mapping.get(index)
+                    if not anchor:
+                        skipped += 1
+                        continue
+
+                    new_caption = f"@after: {anchor}"
+                    if caption:
+                        new_caption = f"{new_caption} | {caption}"
+
+                    if dry_run:
+                        self.stdout.write(f"[DRY RUN] {slug}: {file_name} -> {new_caption}")
+                        updated += 1
+                        continue
+
+                    img.caption = new_caption
+                    to_update.append(img)
                     updated += 1
-                    continue
 
-                img.caption = new_caption
-                img.save(update_fields=["caption"])
-                updated += 1
+                # One UPDATE per slug instead of one per image.
+                if to_update and not dry_run:
+                    BlogPostImage.objects.bulk_update(to_update, ["caption"], batch_size=500)
 
-            self.stdout.write(f"Anchors processed: {slug}")
+                self.stdout.write(f"Anchors processed: {slug}")
 
         self.stdout.write(f"Updated: {updated}, skipped: {skipped}")
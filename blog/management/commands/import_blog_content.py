@@ -1,9 +1,16 @@
-import html
+import functools
+import multiprocessing
+import os
 import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
 from pathlib import Path
 
+import django
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 from django.utils.html import strip_tags
 from django.utils.text import slugify
@@ -12,10 +19,41 @@ from blog.models import BlogPost
 
 try:
     import docx
+    from docx.styles import BabelFish
+    from lxml import etree
 except ImportError as exc:  # pragma: no cover - guarded by requirements
     raise CommandError("python-docx is required to import .docx content") from exc
 
 
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = f"{{{_W_NS}}}"
+_W_BODY = f"{_W}body"
+_W_P = f"{_W}p"
+_W_R = f"{_W}r"
+_W_HYPERLINK = f"{_W}hyperlink"
+_W_T = f"{_W}t"
+_W_BR = f"{_W}br"
+_RUN_TEXT = {
+    f"{_W}tab": "\t",
+    f"{_W}ptab": "\t",
+    f"{_W}cr": "\n",
+    f"{_W}noBreakHyphen": "-",
+}
+_ON_VALUES = {"1", "true", "on"}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_LEADING_NON_LETTERS_RE = re.compile(r"^[^A-Za-zА-Яа-яЁё]+")
+_INTRO_RE = re.compile(r"вступление[:\s]+", re.IGNORECASE)
+_HEADING_PREFIX_RE = re.compile(r"^H[1-6][.:]\s*", re.IGNORECASE)
+
+_TITLE_PREFIXES = ("title:", "h1.", "h1:")
+_DESCRIPTION_PREFIXES = ("description:", "описание:")
+_DATE_PREFIXES = ("date:", "дата:")
+
+# Post fields written by the import, in the order the values tuple is built in handle().
+_IMPORT_FIELDS = ("title", "excerpt", "content_html", "is_published", "published_at")
+
+
 _RU_TRANSLIT = {
     "а": "a",
     "б": "b",
@@ -53,15 +91,14 @@ _RU_TRANSLIT = {
 }
 
 
+# str.translate maps to multi-char strings too, so one C-level pass covers both cases.
+_RU_TRANSLIT_TABLE = str.maketrans(
+    {**_RU_TRANSLIT, **{ch.upper(): value for ch, value in _RU_TRANSLIT.items()}}
+)
+
+
 def _transliterate_ru(text: str) -> str:
-    out: list[str] = []
-    for ch in str(text):
-        lower = ch.lower()
-        if lower in _RU_TRANSLIT:
-            out.append(_RU_TRANSLIT[lower])
-        else:
-            out.append(ch)
-    return "".join(out)
+    return str(text).translate(_RU_TRANSLIT_TABLE)
 
 
 def _slugify_any(text: str) -> str:
@@ -71,18 +108,29 @@ def _slugify_any(text: str) -> str:
     return slugify(_transliterate_ru(text))
 
 
-def _strip_prefix(text: str, prefixes: tuple[str, ...]) -> str:
+def _collapse_whitespace(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _truncate_words(text: str, limit: int = 240) -> str:
+    return text[:limit].rsplit(" ", 1)[0] if len(text) > limit else text
+
+
+def _strip_prefix(text: str, low: str, prefixes: tuple[str, ...]) -> str:
+    """Remove the first matching prefix; ``low`` is ``text.lower()`` computed by the caller."""
     for prefix in prefixes:
-        if text.lower().startswith(prefix):
-            return text[len(prefix) :].strip()
-    return text.strip()
+        if low.startswith(prefix):
+            return text[len(prefix) :].lstrip()
+    return text
 
 
 def _normalize_title(title: str) -> str:
-    title = re.sub(r"\s+", " ", title).strip()
-    if title.lower().startswith("carfast"):
+    title = _collapse_whitespace(title)
+    low = title.lower()
+    if low.startswith("carfast"):
         title = title[len("carfast") :].lstrip(" -—:")
-    if len(title) > 80 and "диагностика пневмосистемы" in title.lower():
+        low = title.lower()
+    if len(title) > 80 and "диагностика пневмосистемы" in low:
         prefix = title.split(":", 1)[0].strip()
         title = f"{prefix}: диагностика пневмосистемы"
     if len(title) <= 80:
@@ -128,8 +176,8 @@ def _parse_date(value: str):
 def _flush_list(parts: list[str], list_items: list[str], list_tag: str | None):
     if not list_items or not list_tag:
         return
-    items_html = "".join(f"<li>{item}</li>" for item in list_items)
-    parts.append(f"<{list_tag}>{items_html}</{list_tag}>")
+    items_html = "</li><li>".join(list_items)
+    parts.append(f"<{list_tag}><li>{items_html}</li></{list_tag}>")
     list_items.clear()
 
 
@@ -141,21 +189,21 @@ def _paragraphs_to_html(paragraphs: list[tuple[str, str]]) -> str:
     for style, text in paragraphs:
         if not text:
             continue
-        heading_match = re.match(r"^H[1-6][.:]\s*", text, flags=re.IGNORECASE)
+        heading_match = _HEADING_PREFIX_RE.match(text)
         if heading_match:
-            text = text[heading_match.end() :].strip()
+            text = text[heading_match.end() :]
 
         if style.startswith("List Bullet"):
             if list_tag not in (None, "ul"):
                 _flush_list(parts, list_items, list_tag)
             list_tag = "ul"
-            list_items.append(html.escape(text))
+            list_items.append(escape(text))
             continue
         if style.startswith("List Number"):
             if list_tag not in (None, "ol"):
                 _flush_list(parts, list_items, list_tag)
             list_tag = "ol"
-            list_items.append(html.escape(text))
+            list_items.append(escape(text))
             continue
 
         _flush_list(parts, list_items, list_tag)
@@ -169,7 +217,7 @@ def _paragraphs_to_html(paragraphs: list[tuple[str, str]]) -> str:
             tag = "h3"
         else:
             tag = "p"
-        parts.append(f"<{tag}>{html.escape(text)}</{tag}>")
+        parts.append(f"<{tag}>{escape(text)}</{tag}>")
 
     _flush_list(parts, list_items, list_tag)
     html_out = "\n".join(parts).strip()
@@ -183,21 +231,116 @@ def _ensure_h2_in_content(content_html: str) -> str:
     """Ensure content has at least one <h2> by promoting first paragraph to h2 if missing."""
     if "<h2>" in content_html:
         return content_html
-    # Replace first <p>...</p> with <h2>...</h2>
+    # Replace first <p>...</p> with <h2>...</h2>.
+    # Fast path: _paragraphs_to_html only emits bare lowercase <p> tags.
+    start = content_html.find("<p>")
+    if start != -1:
+        end = content_html.find("</p>", start + 3)
+        if end != -1:
+            return (
+                content_html[:start]
+                + "<h2>"
+                + content_html[start + 3 : end]
+                + "</h2>"
+                + content_html[end + 4 :]
+            )
     first_p = re.search(r"<p[^>]*>(.*?)</p>", content_html, re.DOTALL | re.IGNORECASE)
     if first_p:
         return content_html[: first_p.start()] + "<h2>" + first_p.group(1) + "</h2>" + content_html[first_p.end() :]
     return content_html
 
 
-def parse_docx_file(path: Path) -> dict:
+@functools.lru_cache(maxsize=64)
+def _styles_map(styles_xml: bytes | None) -> tuple[dict[str, str], str | None]:
+    """Map paragraph styleId -> UI style name (as python-docx reports it), plus the default.
+
+    Keyed on the raw styles.xml bytes: documents built from the same template share one parse.
+    The returned dict is shared between callers and must not be mutated.
+    """
+    styles: dict[str, str] = {}
+    default = None
+    if not styles_xml:
+        return styles, default
+    root = etree.fromstring(styles_xml)
+    for style in root.iterchildren(f"{_W}style"):
+        if style.get(f"{_W}type") != "paragraph":
+            continue
+        name_el = style.find(f"{_W}name")
+        if name_el is None:
+            continue
+        name = BabelFish.internal2ui(name_el.get(f"{_W}val"))
+        style_id = style.get(f"{_W}styleId")
+        if style_id:
+            styles[style_id] = name
+        if style.get(f"{_W}default") in _ON_VALUES:
+            default = name
+    return styles, default
+
+
+def _run_text(run) -> str:
+    out: list[str] = []
+    for child in run:
+        tag = child.tag
+        if tag == _W_T:
+            out.append(child.text or "")
+        elif tag == _W_BR:
+            if child.get(f"{_W}type", "textWrapping") == "textWrapping":
+                out.append("\n")
+        else:
+            out.append(_RUN_TEXT.get(tag, ""))
+    return "".join(out)
+
+
+def _paragraph_text(paragraph) -> str:
+    out: list[str] = []
+    for child in paragraph:
+        if child.tag == _W_R:
+            out.append(_run_text(child))
+        elif child.tag == _W_HYPERLINK:
+            out.extend(_run_text(run) for run in child.iterchildren(_W_R))
+    return "".join(out)
+
+
+def _read_paragraphs_xml(path: Path) -> list[tuple[str, str]]:
+    """Stream body paragraphs straight from word/document.xml (no python-docx object model)."""
+    with zipfile.ZipFile(path) as archive:
+        try:
+            styles_xml = archive.read("word/styles.xml")
+        except KeyError:
+            styles_xml = None
+        styles, default_style = _styles_map(styles_xml)
+        paragraphs: list[tuple[str, str]] = []
+        with archive.open("word/document.xml") as document_xml:
+            for _, element in etree.iterparse(document_xml, events=("end",), tag=_W_P):
+                parent = element.getparent()
+                if parent is None or parent.tag != _W_BODY:
+                    continue
+                text = _paragraph_text(element).strip()
+                if text:
+                    style_el = element.find(f"{_W}pPr/{_W}pStyle")
+                    style_id = style_el.get(f"{_W}val") if style_el is not None else None
+                    style = styles.get(style_id) if style_id else None
+                    paragraphs.append((style or default_style or "Normal", text))
+                element.clear(keep_tail=True)
+    return paragraphs
+
+
+def _read_paragraphs_docx(path: Path) -> list[tuple[str, str]]:
     doc = docx.Document(str(path))
-    paragraphs = [
+    return [
         (p.style.name if p.style else "Normal", p.text.strip())
         for p in doc.paragraphs
         if p.text and p.text.strip()
     ]
 
+
+def parse_docx_file(path: Path) -> dict:
+    try:
+        paragraphs = _read_paragraphs_xml(path)
+    except (KeyError, zipfile.BadZipFile, etree.XMLSyntaxError):
+        # Unfamiliar package layout (e.g. renamed main part): let python-docx resolve it.
+        paragraphs = _read_paragraphs_docx(path)
+
     title = None
     description = None
     published_at = None
@@ -205,32 +348,22 @@ def parse_docx_file(path: Path) -> dict:
     body: list[tuple[str, str]] = []
     first_paragraph = None
 
-    for style, text in paragraphs:
-        normalized = text.strip()
-        if explicit_slug is None and normalized.lower().startswith("slug:"):
-            explicit_slug = _strip_prefix(normalized, ("slug:",))
+    # Paragraph text arrives already stripped from the readers.
+    for style, normalized in paragraphs:
+        low = normalized.lower()
+        if explicit_slug is None and low.startswith("slug:"):
+            explicit_slug = _strip_prefix(normalized, low, ("slug:",))
             continue
-        if title is None and (
-            style.lower() == "title"
-            or normalized.lower().startswith("title:")
-            or normalized.lower().startswith("h1.")
-            or normalized.lower().startswith("h1:")
-        ):
-            title = _strip_prefix(normalized, ("title:", "h1.", "h1:"))
+        if title is None and (style.lower() == "title" or low.startswith(_TITLE_PREFIXES)):
+            title = _strip_prefix(normalized, low, _TITLE_PREFIXES)
             continue
 
-        if description is None and (
-            normalized.lower().startswith("description:")
-            or normalized.lower().startswith("описание:")
-        ):
-            description = _strip_prefix(normalized, ("description:", "описание:"))
+        if description is None and low.startswith(_DESCRIPTION_PREFIXES):
+            description = _strip_prefix(normalized, low, _DESCRIPTION_PREFIXES)
             continue
 
-        if published_at is None and (
-            normalized.lower().startswith("date:")
-            or normalized.lower().startswith("дата:")
-        ):
-            published_at = _parse_date(_strip_prefix(normalized, ("date:", "дата:")))
+        if published_at is None and low.startswith(_DATE_PREFIXES):
+            published_at = _parse_date(_strip_prefix(normalized, low, _DATE_PREFIXES))
             continue
 
         body.append((style, normalized))
@@ -238,10 +371,10 @@ def parse_docx_file(path: Path) -> dict:
             first_paragraph = normalized
 
     if not title:
-        for style, text in body:
+        for idx, (style, text) in enumerate(body):
             if style.startswith("Heading 1"):
                 title = text
-                body.remove((style, text))
+                del body[idx]
                 break
     if not title:
         raise CommandError(f"Title not found in {path.name}")
@@ -251,22 +384,24 @@ def parse_docx_file(path: Path) -> dict:
     if not content_html:
         raise CommandError(f"No content extracted from {path.name}")
 
-    if not description:
-        text = first_paragraph or strip_tags(content_html)
-        text = re.sub(r"\s+", " ", text).strip()
-        description = text[:240].rsplit(" ", 1)[0] if len(text) > 240 else text
+    # Plain text of the body is needed at most once; strip it lazily and reuse.
+    plain_text = functools.cache(lambda: _collapse_whitespace(strip_tags(content_html)))
+
+    if description:
+        description = _collapse_whitespace(description)
+    elif first_paragraph:
+        description = _truncate_words(_collapse_whitespace(first_paragraph))
+    else:
+        description = _truncate_words(plain_text())
 
     if description:
-        description = re.sub(r"\s+", " ", description).strip()
-        description = re.sub(r"^[^A-Za-zА-Яа-яЁё]+", "", description)
-        match = re.search(r"вступление[:\s]+", description, flags=re.IGNORECASE)
+        description = _LEADING_NON_LETTERS_RE.sub("", description)
+        match = _INTRO_RE.search(description)
         if match and match.start() <= 10:
             description = description[match.end() :].strip()
-        if len(description) > 240:
-            description = description[:240].rsplit(" ", 1)[0]
+        description = _truncate_words(description)
         if len(description) < 140:
-            full_text = re.sub(r"\s+", " ", strip_tags(content_html)).strip()
-            description = full_text[:240].rsplit(" ", 1)[0] if len(full_text) > 240 else full_text
+            description = _truncate_words(plain_text())
         if description.lower().startswith("вступление "):
             description = description[len("вступление ") :].strip()
 
@@ -288,27 +423,59 @@ def get_source_files(
     content_dir = base_dir / "_content"
     if not content_dir.exists():
         raise CommandError(f"Content directory not found: {content_dir}")
-    all_files = [f for f in content_dir.iterdir() if f.suffix.lower() == ".docx"]
-    all_files = [
-        f for f in all_files if f.name != "CARFAST_lizing_kredit_2026.docx"
-    ]
-    legacy_files = [
-        f for f in all_files if not f.name.lower().startswith("carfst_")
-    ]
-    files = all_files if include_all else [f for f in all_files if f not in legacy_files]
+    # Filter on DirEntry names; build Path objects only for the files we keep.
+    with os.scandir(content_dir) as entries:
+        names = sorted(
+            entry.name
+            for entry in entries
+            if entry.name.lower().endswith(".docx")
+            and entry.name != "CARFAST_lizing_kredit_2026.docx"
+            and entry.is_file()
+        )
+    files: list[Path] = []
+    legacy_files: list[Path] = []
+    for name in names:
+        is_legacy = not name.lower().startswith("carfst_")
+        if is_legacy:
+            legacy_files.append(content_dir / name)
+        if include_all or not is_legacy:
+            files.append(content_dir / name)
     if not files:
         raise CommandError("No docx files found for import.")
-    return sorted(files), sorted(legacy_files)
+    return files, legacy_files
+
 
+def parse_docx_files(files: list[Path], jobs: int = 1) -> list[dict]:
+    """Parse ``files`` in order, fanning out to worker processes when ``jobs`` > 1.
 
-def _resolve_slug(title: str, check_db: bool = True) -> str:
+    Parsing is pure CPU work (zip + XML + regex) with no ORM access. Workers are spawned
+    rather than forked, so they don't inherit the parent's DB connection or logging
+    threads, and run django.setup() before parsing.
+    """
+    jobs = min(jobs, len(files))
+    if jobs <= 1:
+        return [parse_docx_file(path) for path in files]
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    ) as executor:
+        return list(executor.map(parse_docx_file, files, chunksize=2))
+
+
+def _resolve_slug(title: str, slug_titles: dict[str, str] | None = None) -> str:
+    """Build a slug for ``title``, suffixing it while taken by a post with another title.
+
+    ``slug_titles`` maps existing slugs to their post titles (loaded once per run);
+    pass ``None`` to skip the collision check (dry run).
+    """
     base = _slugify_any(title)
     if not base:
         raise CommandError("Unable to generate slug for title.")
     slug = base
-    if check_db:
+    if slug_titles is not None:
         index = 2
-        while BlogPost.objects.filter(slug=slug).exclude(title=title).exists():
+        while slug in slug_titles and slug_titles[slug] != title:
             slug = f"{base}-{index}"
             index += 1
     return slug
@@ -333,6 +500,15 @@ class Command(BaseCommand):
             action="store_true",
             help="Import all .docx files (including legacy ones).",
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "Number of worker processes used to parse .docx files (default: 1, parse "
+                "in-process). Only parsing runs in the workers; DB writes stay in this process."
+            ),
+        )
 
     def handle(self, *args, **options):
         base_dir = Path(getattr(settings, "BASE_DIR", Path.cwd()))
@@ -356,13 +532,15 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Found {len(files)} files to import.")
 
-        for path in files:
-            data = parse_docx_file(path)
+        slug_titles = None if dry_run else dict(BlogPost.objects.values_list("slug", "title"))
+
+        parsed: list[tuple[Path, str, dict]] = []
+        parsed_files = parse_docx_files(files, options.get("jobs") or 1)
+        for path, data in zip(files, parsed_files, strict=True):
             if data.get("explicit_slug"):
                 slug = data["explicit_slug"]
             else:
-                slug = _resolve_slug(data["title"], check_db=not dry_run)
-            published_at = data["published_at"] or timezone.now()
+                slug = _resolve_slug(data["title"], slug_titles)
 
             if dry_run:
                 self.stdout.write(
@@ -370,31 +548,55 @@ class Command(BaseCommand):
                 )
                 continue
 
-            post, created = BlogPost.objects.get_or_create(
-                slug=slug,
-                defaults={
-                    "title": data["title"],
-                    "excerpt": data["description"],
-                    "content_html": data["content_html"],
-                    "is_published": True,
-                    "published_at": published_at,
-                },
-            )
+            slug_titles[slug] = data["title"]
+            parsed.append((path, slug, data))
 
-            if not created:
-                updated_fields = []
-                for field, value in {
-                    "title": data["title"],
-                    "excerpt": data["description"],
-                    "content_html": data["content_html"],
-                    "is_published": True,
-                    "published_at": published_at,
-                }.items():
+        if not parsed:
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Lock the rows we are about to rewrite; one SELECT, keyed by slug.
+            posts_by_slug = BlogPost.objects.select_for_update().in_bulk(
+                {slug for _, slug, _ in parsed}, field_name="slug"
+            )
+            to_create: list[BlogPost] = []
+            to_update: dict[str, BlogPost] = {}
+            update_fields: set[str] = set()
+
+            for path, slug, data in parsed:
+                published_at = data["published_at"] or now
+                values = (
+                    data["title"],
+                    data["description"],
+                    data["content_html"],
+                    True,
+                    published_at,
+                )
+                post = posts_by_slug.get(slug)
+                if post is None:
+                    post = BlogPost(slug=slug, **dict(zip(_IMPORT_FIELDS, values, strict=True)))
+                    posts_by_slug[slug] = post
+                    to_create.append(post)
+                    self.stdout.write(f"Created {slug} ({path.name})")
+                    continue
+
+                changed = False
+                for field, value in zip(_IMPORT_FIELDS, values, strict=True):
                     if getattr(post, field) != value:
                         setattr(post, field, value)
-                        updated_fields.append(field)
-                if updated_fields:
-                    post.save(update_fields=updated_fields + ["updated_at"])
+                        update_fields.add(field)
+                        changed = True
+                if changed and post.pk is not None:
+                    to_update[slug] = post
                 self.stdout.write(f"Updated {slug} ({path.name})")
-            else:
-                self.stdout.write(f"Created {slug} ({path.name})")
+
+            if to_create:
+                BlogPost.objects.bulk_create(to_create)
+            if to_update:
+                # bulk_update bypasses save(), so auto_now has to be applied by hand.
+                for post in to_update.values():
+                    post.updated_at = now
+                BlogPost.objects.bulk_update(
+                    list(to_update.values()), sorted(update_fields | {"updated_at"})
+                )
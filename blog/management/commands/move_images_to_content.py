@@ -2,6 +2,7 @@
 Management command to move images from gallery to specific places in blog post content.
 Idempotent: safe to run multiple times (won't duplicate images).
 """
+import functools
 import os
 import re
 from django.core.management.base import BaseCommand, CommandError
@@ -10,198 +11,166 @@ from django.utils.html import escape
 
 from blog.models import BlogPost, BlogPostImage
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_TAG_RE = re.compile(r'<[^>]+>')
+# Entities decoded by _extract_text_from_html in one pass. "&amp;lt;"/"&amp;gt;" decode fully,
+# matching the earlier chained str.replace order (&nbsp;, &amp;, &lt;, &gt;).
+_ENTITY_RE = re.compile(r'&nbsp;|&amp;(?:lt;|gt;)?|&lt;|&gt;')
+_ENTITIES = {
+    '&nbsp;': ' ',
+    '&amp;': '&',
+    '&amp;lt;': '<',
+    '&amp;gt;': '>',
+    '&lt;': '<',
+    '&gt;': '>',
+}
+
+# Single-character replacements applied by _normalize_text
+_NORMALIZE_TABLE = str.maketrans({
+    '«': '"',
+    '»': '"',
+    '„': '"',
+    '‚': "'",
+    '\u2019': "'",  # Right single quotation mark
+    '×': 'x',
+    '✕': 'x',
+    '✖': 'x',
+    '\xa0': ' ',  # Non-breaking space
+    '\u2009': ' ',  # Thin space
+    '\u202f': ' ',  # Narrow no-break space
+})
+
+# Opening/closing h2-h4 and p tags, tokenized in document order by _walk_blocks
+_BLOCK_TAG_RE = re.compile(r'<(/?)(h[2-4]|p)\b[^>]*>', re.IGNORECASE)
+
+# Insertion anchors for images 2/3/4 (see Command.handle), matched in a single scan.
+# Each alternative sits inside one zero-width lookahead so a long match cannot hide
+# another anchor's start; anchors never begin at the same position.
+_INSERTION_ANCHORS_RE = re.compile(
+    r'(?=(?P<t2>(?:<h[2-4][^>]*>\s*)?Типовые\s+сценарии[^<]*[""«»„"][^<]*стройка)'
+    r'|(?P<t2_fallback>(?:<h[2-4][^>]*>\s*)?Типовые\s+сценарии)'
+    r'|(?P<t3>1\)\s*Площадка)'
+    r'|(?P<t4>Чек-лист\s+при[её]мки))',
+    re.IGNORECASE | re.DOTALL,
+)
+_FIVE_PARAMS_RE = re.compile(r'<p[^>]*>.*?5\s+параметров.*?</p>', re.IGNORECASE | re.DOTALL)
+
+# Opening tag of figures inserted by this command; see _check_image_already_inserted
+_INLINE_FIGURE_OPEN_RE = re.compile(r'<figure[^>]*data-blog-inline-image="1"[^>]*>', re.IGNORECASE)
+_FIGURE_WINDOW = 512
+
+# Extensions accepted by _image_name_pattern
+_IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.webp'})
+
 
 def _normalize_text(text: str) -> str:
     """Normalize text for comparison: lowercase, replace typographic quotes, ×→x, collapse whitespace."""
     if not text:
         return ""
     
-    # Replace typographic quotes with regular quotes
-    text = text.replace('"', '"').replace('"', '"')
-    text = text.replace('«', '"').replace('»', '"')
-    text = text.replace('„', '"').replace('"', '"')
-    text = text.replace('‚', "'").replace('\u2019', "'")  # Right single quotation mark
-    # Replace multiplication sign with x
-    text = text.replace('×', 'x').replace('×', 'x')
-    text = text.replace('✕', 'x').replace('✖', 'x')
-    # Replace &nbsp; and other HTML entities with space
-    text = text.replace('&nbsp;', ' ')
-    text = text.replace('\xa0', ' ')  # Non-breaking space
-    text = text.replace('\u2009', ' ')  # Thin space
-    text = text.replace('\u202f', ' ')  # Narrow no-break space
+    # Typographic quotes, ×-like signs and exotic spaces in one C-level pass
+    text = text.translate(_NORMALIZE_TABLE)
+    # Replace &nbsp; entity with space
+    if '&' in text:
+        text = text.replace('&nbsp;', ' ')
     # Collapse whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     # Lowercase
     text = text.lower()
     return text.strip()
 
 
+def _decode_entity(match: re.Match) -> str:
+    return _ENTITIES[match.group(0)]
+
+
 def _extract_text_from_html(html: str) -> str:
     """Extract text content from HTML, removing tags."""
     # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', html)
+    text = _TAG_RE.sub('', html)
     # Decode HTML entities (basic ones)
-    text = text.replace('&nbsp;', ' ')
-    text = text.replace('&amp;', '&')
-    text = text.replace('&lt;', '<')
-    text = text.replace('&gt;', '>')
-    return text
+    if '&' not in text:
+        return text
+    return _ENTITY_RE.sub(_decode_entity, text)
 
 
-def _find_html_block(
-    content_html: str,
-    tag_pattern: str,
-    text_keywords: list[str],
-    diagnostic_keywords: list[str] = None,
-) -> int | None:
+@functools.lru_cache(maxsize=8)
+def _walk_blocks(content_html: str) -> tuple[tuple[str, str, str, int], ...]:
     """
-    Find HTML block (heading/paragraph) containing normalized text keywords.
-    
-    Returns position after closing tag, or None if not found.
-    Handles nested tags by counting opening/closing tags.
+    Walk h2-h4/p blocks in one pass over the tag stream.
+
+    Returns (tag, text, normalized_text, start_position) per block in document order, cached
+    per content so repeated lookups share one walk and one normalization. Opening tags are kept
+    on a stack and matched to their closing tag, so nested and unclosed tags are handled
+    without backtracking over the block body.
     """
-    if diagnostic_keywords is None:
-        diagnostic_keywords = text_keywords
-    
-    # Pattern to match opening tag (e.g., h2, h3, h4, p)
-    opening_pattern = re.compile(
-        rf'<({tag_pattern})[^>]*>',
-        re.IGNORECASE,
-    )
-    
-    # Find all opening tags
-    pos = 0
-    while pos < len(content_html):
-        opening_match = opening_pattern.search(content_html, pos)
-        if not opening_match:
-            break
-        
-        tag_name = opening_match.group(1).lower()
-        content_start = opening_match.end()
-        
-        # Find matching closing tag, handling nested tags of the same type
-        tag_count = 1
-        search_pos = content_start
-        
-        while tag_count > 0 and search_pos < len(content_html):
-            # Look for opening tag of same type
-            next_open_match = re.search(
-                rf'<{re.escape(tag_name)}[^>]*>',
-                content_html[search_pos:],
-                re.IGNORECASE,
-            )
-            # Look for closing tag
-            next_close_match = re.search(
-                rf'</{re.escape(tag_name)}>',
-                content_html[search_pos:],
-                re.IGNORECASE,
-            )
-            
-            if next_open_match and next_close_match:
-                if next_open_match.start() < next_close_match.start():
-                    # Found nested opening tag
-                    tag_count += 1
-                    search_pos += next_open_match.end()
-                else:
-                    # Found closing tag
-                    tag_count -= 1
-                    if tag_count == 0:
-                        # This is our matching closing tag
-                        tag_end = search_pos + next_close_match.end()
-                        # Extract inner content (before closing tag)
-                        inner_content = content_html[content_start:search_pos + next_close_match.start()]
-                        
-                        # Normalize the inner content
-                        normalized_inner = _normalize_text(_extract_text_from_html(inner_content))
-                        
-                        # Check if all keywords are present
-                        if all(keyword.lower() in normalized_inner for keyword in text_keywords):
-                            # Return position after closing tag
-                            return tag_end
-                        break
-                    search_pos += next_close_match.end()
-            elif next_close_match:
-                # Only closing tag found
-                tag_count -= 1
-                if tag_count == 0:
-                    tag_end = search_pos + next_close_match.end()
-                    inner_content = content_html[content_start:search_pos + next_close_match.start()]
-                    normalized_inner = _normalize_text(_extract_text_from_html(inner_content))
-                    if all(keyword.lower() in normalized_inner for keyword in text_keywords):
-                        return tag_end
-                    break
-                search_pos += next_close_match.end()
-            else:
-                # No more tags found, break
+    blocks = []
+    open_tags = []  # (tag, start, content_start)
+    for match in _BLOCK_TAG_RE.finditer(content_html):
+        tag = match.group(2).lower()
+        if not match.group(1):
+            open_tags.append((tag, match.start(), match.end()))
+            continue
+        for index in range(len(open_tags) - 1, -1, -1):
+            if open_tags[index][0] == tag:
+                _, start, content_start = open_tags[index]
+                del open_tags[index:]
+                text = _extract_text_from_html(content_html[content_start:match.start()])
+                blocks.append((tag, text, _normalize_text(text), start))
                 break
-        
-        # Move to next position
-        pos = content_start
-    
-    return None
+    blocks.sort(key=lambda block: block[3])
+    return tuple(blocks)
 
 
-def _get_diagnostic_info(content_html: str, keywords: list[str], max_results: int = 5) -> str:
+def _get_diagnostic_info(content_html: str, keywords: tuple[str, ...], max_results: int = 5) -> str:
     """Get diagnostic info: similar headings/paragraphs found."""
     info = []
     
-    # Find all headings
-    heading_pattern = re.compile(r'<h([2-4])[^>]*>(.*?)</h\1>', re.IGNORECASE | re.DOTALL)
-    headings = []
-    for match in heading_pattern.finditer(content_html):
-        text = _extract_text_from_html(match.group(2))
-        normalized = _normalize_text(text)
-        headings.append((normalized, text[:100], match.start()))
-    
-    # Find all paragraphs
-    para_pattern = re.compile(r'<p[^>]*>(.*?)</p>', re.IGNORECASE | re.DOTALL)
-    paragraphs = []
-    for match in para_pattern.finditer(content_html):
-        text = _extract_text_from_html(match.group(1))
-        normalized = _normalize_text(text)
-        paragraphs.append((normalized, text[:100], match.start()))
+    # Headings first, then paragraphs (each in document order), from the shared block walk
+    blocks = [
+        (normalized, text[:100], pos)
+        for tag, text, normalized, pos in sorted(
+            _walk_blocks(content_html), key=lambda block: block[0] == 'p'
+        )
+    ]
     
     # Find similar blocks
-    keyword_str = ' '.join(k.lower() for k in keywords)
+    keywords = tuple(kw.lower() for kw in keywords)
     similar = []
     
-    for normalized, text_preview, pos in headings + paragraphs:
-        if any(kw.lower() in normalized for kw in keywords):
-            similar.append((text_preview, pos))
+    for normalized, text_preview, pos in blocks:
+        if any(kw in normalized for kw in keywords):
+            similar.append((normalized, text_preview, pos))
     
     if similar:
         info.append(f"\nFound {len(similar)} similar blocks (showing first {max_results}):")
-        for text_preview, pos in similar[:max_results]:
+        for _, text_preview, pos in similar[:max_results]:
             # Get context around the match
             start = max(0, pos - 100)
             end = min(len(content_html), pos + 200)
             context = content_html[start:end]
             # Clean context for display
-            context = re.sub(r'\s+', ' ', context)
+            context = _WHITESPACE_RE.sub(' ', context)
             info.append(f"  At position {pos}: {text_preview[:80]}...")
             info.append(f"    Context: ...{context[:150]}...")
     
-    # Find nearest match by keyword
-    if keywords:
-        keyword = keywords[0].lower()
-        best_match = None
-        best_pos = None
-        min_distance = float('inf')
-        
-        for normalized, text_preview, pos in headings + paragraphs:
-            if keyword in normalized:
-                # Simple distance metric (could be improved)
-                distance = abs(len(normalized) - len(keyword))
-                if distance < min_distance:
-                    min_distance = distance
-                    best_match = text_preview
-                    best_pos = pos
+    # Find nearest match by keyword. Any block containing keywords[0] is already in
+    # `similar`, so only those candidates need to be ranked.
+    if similar:
+        keyword = keywords[0]
+        # Simple distance metric (could be improved)
+        best = min(
+            (block for block in similar if keyword in block[0]),
+            key=lambda block: abs(len(block[0]) - len(keyword)),
+            default=None,
+        )
         
-        if best_match:
+        if best and best[1]:
+            _, best_match, best_pos = best
             start = max(0, best_pos - 200)
             end = min(len(content_html), best_pos + 200)
             context = content_html[start:end]
-            context = re.sub(r'\s+', ' ', context)
+            context = _WHITESPACE_RE.sub(' ', context)
             info.append(f"\nNearest match (position {best_pos}):")
             info.append(f"  Text: {best_match[:100]}")
             info.append(f"  Context (±200 chars): ...{context}...")
@@ -209,24 +178,68 @@ def _get_diagnostic_info(content_html: str, keywords: list[str], max_results: in
     return '\n'.join(info) if info else "\nNo similar blocks found."
 
 
-def _check_image_already_inserted(content_html: str, image_url: str, basename: str) -> bool:
-    """Check if image URL or basename already exists in content_html."""
-    # Check for data-blog-inline-image attribute with this image URL
-    escaped_url = re.escape(image_url)
-    figure_pattern = re.compile(
-        rf'<figure[^>]*data-blog-inline-image="1"[^>]*>.*?<img[^>]*src=["\']?{escaped_url}',
-        re.IGNORECASE | re.DOTALL,
-    )
-    if figure_pattern.search(content_html):
-        return True
+def _find_insertion_anchors(content_html: str) -> dict[str, int]:
+    """Return the first start offset of each insertion anchor group found in content_html."""
+    anchors = {}
+    for match in _INSERTION_ANCHORS_RE.finditer(content_html):
+        anchors.setdefault(match.lastgroup, match.start())
+        if 't2' in anchors and 't3' in anchors and 't4' in anchors:
+            break
+    return anchors
+
+
+def _image_name_pattern(base_names: list[str]) -> re.Pattern:
+    """
+    Compile one pattern matching {base}_{2|3|4}(_<any>)?.(png|jpg|jpeg|webp) for any base name.
+
+    Bases are tried in order, so the first base name still wins, as with a per-base loop.
+    """
+    bases = '|'.join(re.escape(base) for base in base_names)
+    return re.compile(rf'^(?:{bases})_(2|3|4)(?:_[^.]*)?\.(png|jpe?g|webp)$', re.IGNORECASE)
+
+
+def _has_occurrences(text: str, needle: str, count: int) -> bool:
+    """True if needle occurs at least count times; stops scanning at the count-th hit."""
+    pos = 0
+    for _ in range(count):
+        pos = text.find(needle, pos)
+        if pos == -1:
+            return False
+        pos += len(needle)
+    return True
+
+
+def _check_image_already_inserted(
+    content_html: str,
+    image_url: str,
+    basename: str,
+    content_lower: str | None = None,
+) -> bool:
+    """
+    Check if image URL or basename already exists in content_html.
+
+    content_lower is content_html.lower(); pass it when checking several images.
+    """
+    if content_lower is None:
+        content_lower = content_html.lower()
+
+    # Check for data-blog-inline-image figure with this image URL. Only the figure body
+    # (up to </figure>, or a bounded window if unclosed) is inspected, never the rest of the page.
+    image_url_lower = image_url.lower()
+    for figure in _INLINE_FIGURE_OPEN_RE.finditer(content_html):
+        body_end = content_lower.find('</figure>', figure.end())
+        if body_end == -1:
+            body_end = figure.end() + _FIGURE_WINDOW
+        body = content_lower[figure.end():body_end]
+        if '<img' in body and image_url_lower in body:
+            return True
     
     # Check if basename (e.g., x3000-8x4-komplektaciya_2.png) appears in content_html
-    escaped_basename = re.escape(basename)
-    if re.search(escaped_basename, content_html, re.IGNORECASE):
+    if basename.lower() in content_lower:
         return True
     
     # Fallback: check if URL exists anywhere
-    return bool(re.search(escaped_url, content_html))
+    return image_url in content_html
 
 
 def _build_figure_html(image_url: str, alt_text: str, caption_text: str) -> str:
@@ -256,13 +269,16 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        slug = options["slug"]
-        dry_run = options.get("dry_run", False)
+        # One transaction: select_for_update() needs it, and the lock covers the whole run
+        with transaction.atomic():
+            self._move_images(options["slug"], options.get("dry_run", False))
 
+    def _move_images(self, slug: str, dry_run: bool):
         try:
-            post = BlogPost.objects.select_for_update().get(slug=slug)
+            post = BlogPost.objects.select_for_update().prefetch_related("images").get(slug=slug)
         except BlogPost.DoesNotExist:
             raise CommandError(f"Blog post with slug '{slug}' not found")
+        images = list(post.images.all())
 
         # Build list of base names to search for
         # slug: shacman-x3000-8x4-komplektaciya
@@ -274,28 +290,24 @@ class Command(BaseCommand):
             if len(parts) > 1:
                 base_names.append(parts[1])
         
+        # One compiled pattern for all base names, shared by the cleanup and matching passes
+        image_name_pattern = _image_name_pattern(base_names)
+
         # Idempotency: if content already has markers for 2/3/4, consider post migrated
         content_html = post.content_html
 
-        def _content_has_all_three_markers(html: str) -> bool:
-            return html.count('class="blog-inline-image"') >= 3
-
-        if _content_has_all_three_markers(content_html):
+        if _has_occurrences(content_html, 'class="blog-inline-image"', 3):
             # Delete any gallery images matching _2/_3/_4 as duplicates (re-added)
             to_remove = []
-            for img in post.images.all():
+            for img in images:
                 if not img.image.name:
                     continue
-                basename = os.path.basename(img.image.name)
-                for base in base_names:
-                    if re.match(rf"^{re.escape(base)}_(2|3|4)(?:_[^.]*)?\.(png|jpe?g|webp)$", basename, re.IGNORECASE):
-                        to_remove.append(img)
-                        break
+                if image_name_pattern.match(os.path.basename(img.image.name)):
+                    to_remove.append(img)
             if to_remove and not dry_run:
-                with transaction.atomic():
-                    for img in to_remove:
-                        img.delete()
-                        self.stdout.write(f"✓ Removed duplicate from gallery: {img.image.name}")
+                post.images.filter(pk__in=[img.pk for img in to_remove]).delete()
+                for img in to_remove:
+                    self.stdout.write(f"✓ Removed duplicate from gallery: {img.image.name}")
             self.stdout.write(
                 self.style.SUCCESS("Post already migrated (markers present). Nothing to insert.")
             )
@@ -306,26 +318,23 @@ class Command(BaseCommand):
         all_gallery_basenames = []
         candidates_by_num = {2: [], 3: [], 4: []}
 
-        for img in post.images.all():
+        for img in images:
             if not img.image.name:
                 continue
             
             basename = os.path.basename(img.image.name)
             all_gallery_basenames.append(basename)
             
-            # Try each base name
-            for base in base_names:
-                # Pattern: {base}_{n}.(png|jpg|jpeg|webp) or {base}_{n}_<any>.(png|jpg|jpeg|webp)
-                pattern = re.compile(
-                    rf'^{re.escape(base)}_(2|3|4)(?:_[^.]*)?\.(png|jpe?g|webp)$',
-                    re.IGNORECASE,
-                )
-                match = pattern.match(basename)
-                if match:
-                    image_num = int(match.group(1))
-                    if image_num in [2, 3, 4]:
-                        candidates_by_num[image_num].append((basename, img))
-                        break
+            # Cheap extension check before the regex; most unrelated files stop here
+            if os.path.splitext(basename)[1].lower() not in _IMAGE_EXTENSIONS:
+                continue
+
+            # Try all base names at once
+            match = image_name_pattern.match(basename)
+            if match:
+                image_num = int(match.group(1))
+                if image_num in [2, 3, 4]:
+                    candidates_by_num[image_num].append((basename, img))
         
         # Check for duplicates and build final mapping
         for num in [2, 3, 4]:
@@ -370,6 +379,7 @@ class Command(BaseCommand):
         image_urls = {}
         image_htmls = {}
         already_inserted = {}
+        content_lower = content_html.lower()
 
         # Prepare image HTML for each image and check idempotency
         for num, img in images_to_move.items():
@@ -378,7 +388,7 @@ class Command(BaseCommand):
             basename = os.path.basename(img.image.name)
 
             # Check if already inserted (idempotency)
-            if _check_image_already_inserted(content_html, image_url, basename):
+            if _check_image_already_inserted(content_html, image_url, basename, content_lower):
                 already_inserted[num] = True
                 self.stdout.write(
                     self.style.WARNING(
@@ -412,95 +422,48 @@ class Command(BaseCommand):
             )
             return
 
+        # Locate all insertion points in one scan of the original content. Anchors never
+        # occur inside the generated figures, so offsets found before any insertion are final.
+        anchors = _find_insertion_anchors(content_html)
+        # (offset, inserted after preceding block?, image number)
+        insertions = []
+
         # Insert image 2: before "Типовые сценарии" (handles typographic quotes)
         if 2 not in already_inserted:
-            # Find position of "Типовые сценарии" - allow attributes, typographic quotes
-            # Pattern: (optional opening tag) + "Типовые сценарии" + (any quotes) + "стройка"
-            pattern = re.compile(
-                r'(?:<h[2-4][^>]*>\s*)?Типовые\s+сценарии[^<]*[""«»„"][^<]*стройка',
-                re.IGNORECASE | re.DOTALL,
-            )
-            match = pattern.search(content_html)
-            
-            if match:
-                insert_pos = match.start()
-                content_html = (
-                    content_html[:insert_pos]
-                    + "\n"
-                    + image_htmls[2]
-                    + "\n"
-                    + content_html[insert_pos:]
-                )
+            if 't2' in anchors:
+                insertions.append((anchors['t2'], False, 2))
                 self.stdout.write("✓ Image 2 inserted before 'Типовые сценарии'")
-            else:
+            elif 't2_fallback' in anchors:
                 # Fallback: just "Типовые сценарии"
-                pattern_fallback = re.compile(
-                    r'(?:<h[2-4][^>]*>\s*)?Типовые\s+сценарии',
-                    re.IGNORECASE,
+                insertions.append((anchors['t2_fallback'], False, 2))
+                self.stdout.write("✓ Image 2 inserted before 'Типовые сценарии' (fallback)")
+            else:
+                diagnostic = _get_diagnostic_info(
+                    content_html,
+                    ('типовые сценарии', 'стройка'),
+                )
+                raise CommandError(
+                    "Could not find insertion point for image 2.\n"
+                    "Looking for 'Типовые сценарии ... стройка'"
+                    + diagnostic
                 )
-                match_fallback = pattern_fallback.search(content_html)
-                if match_fallback:
-                    insert_pos = match_fallback.start()
-                    content_html = (
-                        content_html[:insert_pos]
-                        + "\n"
-                        + image_htmls[2]
-                        + "\n"
-                        + content_html[insert_pos:]
-                    )
-                    self.stdout.write("✓ Image 2 inserted before 'Типовые сценарии' (fallback)")
-                else:
-                    diagnostic = _get_diagnostic_info(
-                        content_html,
-                        ['типовые сценарии', 'стройка'],
-                    )
-                    raise CommandError(
-                        "Could not find insertion point for image 2.\n"
-                        "Looking for 'Типовые сценарии ... стройка'"
-                        + diagnostic
-                    )
 
         # Insert image 3: before "1) Площадка" (or after paragraph with "5 параметров")
         if 3 not in already_inserted:
-            # First try to find "1) Площадка"
-            pattern = re.compile(
-                r'1\)\s*Площадка',
-                re.IGNORECASE,
-            )
-            match = pattern.search(content_html)
-            
-            if match:
-                insert_pos = match.start()
-                content_html = (
-                    content_html[:insert_pos]
-                    + "\n"
-                    + image_htmls[3]
-                    + "\n"
-                    + content_html[insert_pos:]
-                )
+            if 't3' in anchors:
+                insertions.append((anchors['t3'], False, 3))
                 self.stdout.write("✓ Image 3 inserted before '1) Площадка'")
             else:
                 # Fallback: find paragraph with "5 параметров" and insert after it
-                para_pattern = re.compile(
-                    r'<p[^>]*>.*?5\s+параметров.*?</p>',
-                    re.IGNORECASE | re.DOTALL,
-                )
-                para_match = para_pattern.search(content_html)
-                
+                para_match = _FIVE_PARAMS_RE.search(content_html)
+
                 if para_match:
-                    insert_pos = para_match.end()
-                    content_html = (
-                        content_html[:insert_pos]
-                        + "\n"
-                        + image_htmls[3]
-                        + "\n"
-                        + content_html[insert_pos:]
-                    )
+                    insertions.append((para_match.end(), True, 3))
                     self.stdout.write("✓ Image 3 inserted after '5 параметров' paragraph")
                 else:
                     diagnostic = _get_diagnostic_info(
                         content_html,
-                        ['5 параметров', '1)', 'площадка'],
+                        ('5 параметров', '1)', 'площадка'),
                     )
                     raise CommandError(
                         "Could not find insertion point for image 3.\n"
@@ -510,27 +473,13 @@ class Command(BaseCommand):
 
         # Insert image 4: before "Чек-лист приёмки" (handles е/ё variation)
         if 4 not in already_inserted:
-            # Pattern: "Чек-лист при[её]мки" - handles е/ё variation
-            pattern = re.compile(
-                r'Чек-лист\s+при[её]мки',
-                re.IGNORECASE,
-            )
-            match = pattern.search(content_html)
-            
-            if match:
-                insert_pos = match.start()
-                content_html = (
-                    content_html[:insert_pos]
-                    + "\n"
-                    + image_htmls[4]
-                    + "\n"
-                    + content_html[insert_pos:]
-                )
+            if 't4' in anchors:
+                insertions.append((anchors['t4'], False, 4))
                 self.stdout.write("✓ Image 4 inserted before 'Чек-лист приёмки'")
             else:
                 diagnostic = _get_diagnostic_info(
                     content_html,
-                    ['чек-лист', 'приёмки', 'приемки'],
+                    ('чек-лист', 'приёмки', 'приемки'),
                 )
                 raise CommandError(
                     "Could not find insertion point for image 4.\n"
@@ -538,6 +487,18 @@ class Command(BaseCommand):
                     + diagnostic
                 )
 
+        # Splice all figures in one pass. At equal offsets a figure placed after the
+        # preceding paragraph comes before one placed in front of the next text.
+        if insertions:
+            insertions.sort(key=lambda item: (item[0], not item[1]))
+            pieces = []
+            prev_pos = 0
+            for insert_pos, _, num in insertions:
+                pieces.extend((content_html[prev_pos:insert_pos], "\n", image_htmls[num], "\n"))
+                prev_pos = insert_pos
+            pieces.append(content_html[prev_pos:])
+            content_html = "".join(pieces)
+
         if dry_run:
             self.stdout.write("\n[DRY RUN] Would update content_html and delete images:")
             for num in [2, 3, 4]:
@@ -551,19 +512,18 @@ class Command(BaseCommand):
                 )
             return
 
-        # Apply changes in transaction
-        with transaction.atomic():
-            # Save updated content
-            post.content_html = content_html
-            post.save(update_fields=["content_html", "updated_at"])
-
-            # Delete images from gallery (only those that were inserted)
-            deleted_count = 0
-            for num, img in images_to_move.items():
-                if num not in already_inserted:
-                    img.delete()
-                    deleted_count += 1
-                    self.stdout.write(f"✓ Deleted image {num} from gallery: {img.image.name}")
+        # Apply changes (handle() already runs inside a transaction)
+        post.content_html = content_html
+        post.save(update_fields=["content_html", "updated_at"])
+
+        # Delete images from gallery (only those that were inserted), in one DELETE
+        to_delete = {
+            num: img for num, img in images_to_move.items() if num not in already_inserted
+        }
+        post.images.filter(pk__in=[img.pk for img in to_delete.values()]).delete()
+        deleted_count = len(to_delete)
+        for num, img in to_delete.items():
+            self.stdout.write(f"✓ Deleted image {num} from gallery: {img.image.name}")
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_blogpost_topics"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(fields=["-updated_at"], name="blogpost_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["is_published", "-published_at"],
+                name="blogpost_pub_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogpostimage",
+            index=models.Index(fields=["post", "sort_order"], name="blogpostimage_post_sort_idx"),
+        ),
+    ]
@@ -30,6 +30,13 @@ class BlogPost(models.Model):
 
     class Meta:
         ordering = ["-published_at", "-created_at"]
+        indexes = [
+            models.Index(fields=["-updated_at"], name="blogpost_updated_idx"),
+            models.Index(
+                fields=["is_published", "-published_at"],
+                name="blogpost_pub_published_idx",
+            ),
+        ]
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
 
@@ -52,5 +59,8 @@ class BlogPostImage(models.Model):
 
     class Meta:
         ordering = ["sort_order", "id"]
+        indexes = [
+            models.Index(fields=["post", "sort_order"], name="blogpostimage_post_sort_idx"),
+        ]
         verbose_name = "Изображение статьи"
         verbose_name_plural = "Изображения статьи"
@@ -1,16 +1,21 @@
 from django.contrib.sitemaps import Sitemap
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 
 from .models import BlogPost
 
+BLOG_INDEX_LASTMOD_CACHE_KEY = "blog_index_lastmod"
+BLOG_INDEX_LASTMOD_CACHE_SECONDS = 300
+
 
 class BlogPostSitemap(Sitemap):
     changefreq = "monthly"
     priority = 0.6
 
     def items(self):
-        return BlogPost.objects.published().order_by("pk")
+        # Sitemap pagination needs count() and slicing, so keep a queryset (no iterator())
+        return BlogPost.objects.published().only("slug", "updated_at").order_by("pk")
 
     def location(self, obj):
         return obj.get_absolute_url()
@@ -30,6 +35,15 @@ class BlogIndexSitemap(Sitemap):
         return reverse("blog:blog_list")
 
     def lastmod(self, obj):
-        # Use latest post update or now
-        latest = BlogPost.objects.published().order_by("-updated_at").values_list("updated_at", flat=True).first()
+        # Use latest post update or now; the lookup is cached so frequent crawls don't hit the DB
+        latest = cache.get_or_set(
+            BLOG_INDEX_LASTMOD_CACHE_KEY,
+            lambda: (
+                BlogPost.objects.published()
+                .order_by("-updated_at")
+                .values_list("updated_at", flat=True)
+                .first()
+            ),
+            BLOG_INDEX_LASTMOD_CACHE_SECONDS,
+        )
         return latest or timezone.now()
@@ -1,9 +1,11 @@
+import functools
+import hashlib
 import html as html_stdlib
 import json
-import math
 import re
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, render
 from django.utils.html import strip_tags
@@ -11,11 +13,10 @@ from django.utils.html import strip_tags
 from .models import BlogPost
 
 try:
-    from lxml import etree, html as lxml_html
+    from lxml import html as lxml_html
     HAS_LXML = True
 except ImportError:
     HAS_LXML = False
-    etree = None
     lxml_html = None
 
 
@@ -24,24 +25,24 @@ def _canonical_url(path: str) -> str:
     return f"https://{canonical_host}{path}"
 
 
-def _build_breadcrumb_schema(request, items: list[dict]) -> dict:
+def _build_breadcrumb_schema(scheme_host: str, items: tuple[tuple[str, str], ...]) -> dict:
     """
     Build BreadcrumbList JSON-LD schema.
     
     Args:
-        request: Django request object
-        items: List of dicts with 'name' and 'url' keys
+        scheme_host: "<scheme>://<host>" of the current request
+        items: Tuple of (name, url) pairs with site-relative urls
     
     Returns:
         BreadcrumbList schema dict
     """
     breadcrumb_items = []
-    for position, item in enumerate(items, start=1):
+    for position, (name, url) in enumerate(items, start=1):
         breadcrumb_items.append({
             "@type": "ListItem",
             "position": position,
-            "name": item["name"],
-            "item": request.build_absolute_uri(item["url"]),
+            "name": name,
+            "item": scheme_host + url,
         })
     
     return {
@@ -51,16 +52,82 @@ def _build_breadcrumb_schema(request, items: list[dict]) -> dict:
     }
 
 
+def _build_blogposting_schema(
+    title: str,
+    excerpt: str,
+    canonical: str,
+    published_iso: str | None,
+    updated_iso: str,
+    image_url: str | None,
+) -> dict:
+    schema = {
+        "@context": "https://schema.org",
+        "@type": "BlogPosting",
+        "headline": title,
+        "description": excerpt,
+        "url": canonical,
+        "mainEntityOfPage": {
+            "@type": "WebPage",
+            "@id": canonical,
+        },
+        "datePublished": published_iso,
+        "dateModified": updated_iso,
+        "author": {
+            "@type": "Organization",
+            "@id": "https://carfst.ru/#organization",
+            "name": "CARFAST",
+        },
+        "publisher": {
+            "@type": "Organization",
+            "@id": "https://carfst.ru/#organization",
+            "name": "CARFAST",
+        },
+    }
+    if image_url:
+        schema["image"] = image_url
+    return schema
+
+
+@functools.lru_cache(maxsize=1024)
+def _schema_payload(
+    scheme_host: str,
+    breadcrumbs: tuple[tuple[str, str], ...],
+    blogposting: tuple | None = None,
+) -> str:
+    """
+    Serialized JSON-LD payload (objects without the outer list brackets).
+
+    Memoized: every argument is hashable and a post edit changes updated_at,
+    so repeat requests for the same page skip dict building and json.dumps.
+    """
+    schema_items = []
+    if blogposting is not None:
+        schema_items.append(_build_blogposting_schema(*blogposting))
+    schema_items.append(_build_breadcrumb_schema(scheme_host, breadcrumbs))
+    # Same text as json.dumps(schema_items)[1:-1], without serializing the brackets and slicing
+    return ", ".join(json.dumps(item, ensure_ascii=False) for item in schema_items)
+
+
+def _scheme_host(request) -> str:
+    # Same prefix request.build_absolute_uri() puts in front of "/..." paths
+    return f"{request.scheme}://{request.get_host()}"
+
+
+_WS_RE = re.compile(r"\s+")
+# A tag, or a word (group 1) outside tags
+_TAG_OR_WORD_RE = re.compile(r"<[^>]*>|([^\s<]+)")
+
+
 def _reading_time_minutes(html: str) -> int:
-    text = strip_tags(html or "")
-    words = [w for w in re.split(r"\s+", text) if w]
-    if not words:
-        return 1
-    return max(1, math.ceil(len(words) / 180))
+    # Count words in one pass over the raw HTML instead of strip_tags() + split;
+    # a word split by an inline tag counts twice, which is fine for an estimate.
+    words = sum(1 for m in _TAG_OR_WORD_RE.finditer(html or "") if m.group(1))
+    # ceil(words / 180) in integer arithmetic; no words still reads as 1 minute
+    return max(1, -(-words // 180))
 
 
 def _normalize_anchor(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "")).strip().lower()
+    return _WS_RE.sub(" ", (text or "")).strip().lower()
 
 
 def _extract_anchor_and_caption(caption: str | None) -> tuple[str | None, str | None]:
@@ -77,126 +144,102 @@ def _extract_anchor_and_caption(caption: str | None) -> tuple[str | None, str |
     return raw, None
 
 
-# Regex to find <h2...> or <h3...> opening tag; group 1 is tag name
-_HEADING_OPEN = re.compile(r"<(h2|h3)(\s[^>]*)?>", re.IGNORECASE)
+def _image_anchors(images) -> list[tuple[object, str, str | None]]:
+    """(image, normalized anchor, figcaption) for images whose caption has an "@after:" anchor."""
+    out = []
+    for img in images:
+        anchor, figcaption = _extract_anchor_and_caption(img.caption)
+        if not anchor:
+            continue
+        anchor_norm = _normalize_anchor(anchor)
+        if anchor_norm:
+            out.append((img, anchor_norm, figcaption))
+    return out
+
+
+# h2/h3 block: group 1 is tag name, group 2 is inner html up to the matching closing tag
+_HEADING_BLOCK = re.compile(r"<(h2|h3)(?:\s[^>]*)?>(.*?)</\1>", re.IGNORECASE | re.DOTALL)
 
 
 def _find_headings_stdio(html: str) -> list[tuple[int, str]]:
     """
     Find all h2/h3 blocks; return list of (end_position, inner_text).
-    Uses regex + balance for closing tag. No lxml.
+    Single regex pass, no lxml. Headings don't nest in valid HTML, so the
+    first closing tag of the same name ends the block.
     """
-    out: list[tuple[int, str]] = []
-    i = 0
-    while i < len(html):
-        m = _HEADING_OPEN.search(html, i)
-        if not m:
-            break
-        tag = m.group(1).lower()
-        start_inner = m.end()
-        close_tag = f"</{tag}>"
-        depth = 1
-        pos = start_inner
-        while depth > 0 and pos < len(html):
-            next_open = html.find(f"<{tag}", pos)
-            next_close = html.find(close_tag, pos)
-            if next_close == -1:
-                break
-            if next_open != -1 and next_open < next_close:
-                depth += 1
-                pos = next_open + 1
-            else:
-                depth -= 1
-                if depth == 0:
-                    end_inner = next_close
-                    end_outer = next_close + len(close_tag)
-                    inner_html = html[start_inner:end_inner]
-                    inner_text = strip_tags(inner_html)
-                    out.append((end_outer, inner_text))
-                    i = end_outer
-                    break
-                pos = next_close + len(close_tag)
-        else:
-            i = start_inner + 1
-    return out
+    return [(m.end(), strip_tags(m.group(2))) for m in _HEADING_BLOCK.finditer(html)]
 
 
-def _inject_images_stdlib(html: str, images) -> tuple[str, list[int]]:
+def _inject_images_stdlib(html: str, images, post_title: str = "") -> tuple[str, list[int]]:
     """Fallback when lxml is not installed: regex-based h2/h3 find + string insert."""
     if not html or not images:
         return html, []
 
-    headings = _find_headings_stdio(html)
-    # (end_position, list of (figure_html, image_id))
-    insertions: list[tuple[int, list[tuple[str, int]]]] = []
+    # Normalize heading texts once, not once per image
+    headings = [
+        (end_pos, _normalize_anchor(heading_text))
+        for end_pos, heading_text in _find_headings_stdio(html)
+    ]
+    # end_position -> list of (figure_html, image_id)
+    insertions: dict[int, list[tuple[str, int]]] = {}
     used_ids: list[int] = []
 
-    for img in images:
-        anchor, figcaption = _extract_anchor_and_caption(img.caption)
-        if not anchor:
-            continue
-        anchor_norm = _normalize_anchor(anchor)
-        for end_pos, heading_text in headings:
-            if anchor_norm and anchor_norm in _normalize_anchor(heading_text):
+    for img, anchor_norm, figcaption in _image_anchors(images):
+        for end_pos, heading_norm in headings:
+            if anchor_norm in heading_norm:
                 src = html_stdlib.escape(img.image.url, quote=True)
-                alt = html_stdlib.escape(img.alt or img.post.title, quote=True)
+                alt = html_stdlib.escape(img.alt or post_title, quote=True)
                 fig_html = f'<figcaption>{html_stdlib.escape(figcaption)}</figcaption>' if figcaption else ""
                 figure_html = (
                     f'<figure class="blog-inline-image" data-blog-inline-image="1">'
                     f'<img src="{src}" alt="{alt}" class="img-fluid" loading="lazy" decoding="async">'
                     f"{fig_html}</figure>"
                 )
-                found = False
-                for idx, (pos, figs) in enumerate(insertions):
-                    if pos == end_pos:
-                        figs.append((figure_html, img.id))
-                        found = True
-                        break
-                if not found:
-                    insertions.append((end_pos, [(figure_html, img.id)]))
+                insertions.setdefault(end_pos, []).append((figure_html, img.id))
                 used_ids.append(img.id)
                 break
 
     if not insertions:
         return html, used_ids
 
-    insertions.sort(key=lambda x: x[0])
     parts: list[str] = []
     prev = 0
-    for pos, figs in insertions:
+    for pos, figs in sorted(insertions.items()):
         parts.append(html[prev:pos])
-        for figure_html, _ in figs:
-            parts.append(figure_html)
+        parts.extend(figure_html for figure_html, _ in figs)
         prev = pos
     parts.append(html[prev:])
     return "".join(parts), used_ids
 
 
-def inject_images_into_html(html: str, images) -> tuple[str, list[int]]:
+def inject_images_into_html(html: str, images, post_title: str = "") -> tuple[str, list[int]]:
+    """post_title is the alt text for images without their own alt."""
     if not html or not images:
         return html, []
+    # Most posts have no inline-image annotations: skip the parse entirely
+    if not any(img.caption and "@after:" in img.caption for img in images):
+        return html, []
 
     if HAS_LXML:
-        return _inject_images_lxml(html, images)
-    return _inject_images_stdlib(html, images)
+        return _inject_images_lxml(html, images, post_title)
+    return _inject_images_stdlib(html, images, post_title)
 
 
-def _inject_images_lxml(html: str, images) -> tuple[str, list[int]]:
+def _inject_images_lxml(html: str, images, post_title: str = "") -> tuple[str, list[int]]:
     """Requires lxml (used only when HAS_LXML is True)."""
     container = lxml_html.fragment_fromstring(html, create_parent="div")
-    headings = container.xpath(".//h2|.//h3")
+    # Normalize heading texts once, not once per image
+    headings = [
+        (heading, _normalize_anchor(" ".join(heading.itertext())))
+        for heading in container.xpath(".//h2|.//h3")
+    ]
     used_ids: list[int] = []
     last_by_heading: dict = {}
 
-    for img in images:
-        anchor, figcaption = _extract_anchor_and_caption(img.caption)
-        if not anchor:
-            continue
-        anchor_norm = _normalize_anchor(anchor)
+    for img, anchor_norm, figcaption in _image_anchors(images):
         target = None
-        for heading in headings:
-            heading_text = _normalize_anchor(" ".join(heading.itertext()))
-            if anchor_norm and anchor_norm in heading_text:
+        for heading, heading_norm in headings:
+            if anchor_norm in heading_norm:
                 target = heading
                 break
         if target is None:
@@ -209,7 +252,7 @@ def _inject_images_lxml(html: str, images) -> tuple[str, list[int]]:
         img_el = lxml_html.Element(
             "img",
             src=img.image.url,
-            alt=img.alt or img.post.title,
+            alt=img.alt or post_title,
             loading="lazy",
             decoding="async",
         )
@@ -225,11 +268,33 @@ def _inject_images_lxml(html: str, images) -> tuple[str, list[int]]:
         last_by_heading[target] = figure
         used_ids.append(img.id)
 
-    html_parts = [
-        etree.tostring(child, encoding="unicode", method="html")
-        for child in container
-    ]
-    return "".join(html_parts).strip(), used_ids
+    # Serialize once and slice off the wrapper "<div>" / "</div>"
+    html_out = lxml_html.tostring(container, encoding="unicode", method="html")
+    return html_out[5:-6].strip(), used_ids
+
+
+BLOG_DETAIL_CACHE_SECONDS = 3600
+
+
+def _render_post_content(post, images) -> tuple[str, list[int], int]:
+    """
+    Return (content_with_images, used_ids, reading_time) for blog_detail, cached.
+
+    The key covers post.updated_at and every image field the injection reads,
+    so editing the post or any of its images yields a fresh entry.
+    """
+    images_key = hashlib.sha1(
+        repr([(img.id, img.image.name, img.alt, img.caption) for img in images]).encode("utf-8")
+    ).hexdigest()
+    cache_key = f"blog:detail:{post.pk}:{post.updated_at.isoformat()}:{images_key}"
+
+    def _render():
+        content_with_images, used_ids = inject_images_into_html(
+            post.content_html, images, post.title
+        )
+        return content_with_images, used_ids, _reading_time_minutes(post.content_html)
+
+    return cache.get_or_set(cache_key, _render, BLOG_DETAIL_CACHE_SECONDS)
 
 
 def blog_list(request):
@@ -243,16 +308,13 @@ def blog_list(request):
         meta_robots = "noindex, follow"
 
     # Build breadcrumb schema - only on clean URLs (no GET params) - SEO invariant
-    from django.urls import reverse
-    breadcrumb_items = [
-        {"name": "Главная", "url": reverse("catalog:home")},
-        {"name": "Блог", "url": "/blog/"},
-    ]
-    
     if not request.GET:
-        breadcrumb_schema = _build_breadcrumb_schema(request, breadcrumb_items)
-        schema_items = [breadcrumb_schema]
-        page_schema_payload = json.dumps(schema_items, ensure_ascii=False)[1:-1]
+        from django.urls import reverse
+        breadcrumb_items = (
+            ("Главная", reverse("catalog:home")),
+            ("Блог", "/blog/"),
+        )
+        page_schema_payload = _schema_payload(_scheme_host(request), breadcrumb_items)
     else:
         page_schema_payload = ""
 
@@ -284,52 +346,34 @@ def blog_detail(request, slug):
 
     og_image = post.cover_image.url if post.cover_image else None
 
-    images = list(post.images.order_by("sort_order", "id"))
-    content_with_images, used_ids = inject_images_into_html(
-        post.content_html, images
+    # Only the columns the injection and gallery read; "post" keeps the reverse
+    # relation's cached post assignment from loading post_id lazily per image
+    images = list(
+        post.images.only("id", "post", "image", "alt", "caption", "sort_order")
+        .order_by("sort_order", "id")
     )
+    content_with_images, used_ids, reading_time = _render_post_content(post, images)
     remaining_images = [img for img in images if img.id not in used_ids]
 
-    # Build BlogPosting JSON-LD schema
-    blogposting_schema = {
-        "@context": "https://schema.org",
-        "@type": "BlogPosting",
-        "headline": post.title,
-        "description": post.excerpt,
-        "url": canonical,
-        "mainEntityOfPage": {
-            "@type": "WebPage",
-            "@id": canonical,
-        },
-        "datePublished": post.published_at.isoformat() if post.published_at else None,
-        "dateModified": post.updated_at.isoformat(),
-        "author": {
-            "@type": "Organization",
-            "@id": "https://carfst.ru/#organization",
-            "name": "CARFAST",
-        },
-        "publisher": {
-            "@type": "Organization",
-            "@id": "https://carfst.ru/#organization",
-            "name": "CARFAST",
-        },
-    }
-    if og_image:
-        blogposting_schema["image"] = request.build_absolute_uri(og_image)
-    
-    # Build breadcrumb schema
-    from django.urls import reverse
-    breadcrumb_items = [
-        {"name": "Главная", "url": reverse("catalog:home")},
-        {"name": "Блог", "url": "/blog/"},
-        {"name": post.title, "url": post.get_absolute_url()},
-    ]
-    breadcrumb_schema = _build_breadcrumb_schema(request, breadcrumb_items)
-    
     # JSON-LD schema only on clean URLs (no GET params) - SEO invariant
     if not request.GET:
-        schema_items = [blogposting_schema, breadcrumb_schema]
-        page_schema_payload = json.dumps(schema_items, ensure_ascii=False)[1:-1].strip()
+        from django.urls import reverse
+        breadcrumb_items = (
+            ("Главная", reverse("catalog:home")),
+            ("Блог", "/blog/"),
+            (post.title, post.get_absolute_url()),
+        )
+        blogposting = (
+            post.title,
+            post.excerpt,
+            canonical,
+            post.published_at.isoformat() if post.published_at else None,
+            post.updated_at.isoformat(),
+            request.build_absolute_uri(og_image) if og_image else None,
+        )
+        page_schema_payload = _schema_payload(
+            _scheme_host(request), breadcrumb_items, blogposting
+        )
     else:
         page_schema_payload = ""
 
@@ -348,7 +392,7 @@ def blog_detail(request, slug):
         "og_url": canonical,
         "og_type": "article",
         "og_image": og_image,
-        "reading_time": _reading_time_minutes(post.content_html),
+        "reading_time": reading_time,
         "content_with_images": content_with_images,
         "remaining_images": remaining_images,
         "page_schema_payload": page_schema_payload,
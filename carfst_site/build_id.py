@@ -5,33 +5,32 @@ Format: YYYY-MM-DD_N (date + sequential number for that day)
 from __future__ import annotations
 
 import os
+import time
 from pathlib import Path
 
+# Re-check the BUILD_ID file at most this often (it only changes on deploy)
+_RECHECK_SECONDS = 60.0
+
 _CACHED_BUILD_ID: str | None = None
 _CACHED_MTIME: float | None = None
 _BUILD_ID_FILE: Path | None = None
+_RESOLVED_BUILD_ID: str | None = None
+_LAST_CHECK: float = 0.0
 
-def get_build_id() -> str:
-    """
-    Return build id string for deployment verification.
 
-    Priority:
-    1) BUILD_ID file in project root (next to manage.py)
-    2) env BUILD_ID
-    3) "dev" fallback
-    """
+def _read_build_id() -> str:
     global _CACHED_BUILD_ID, _CACHED_MTIME, _BUILD_ID_FILE
     # Check BUILD_ID file in project root (next to manage.py)
     if _BUILD_ID_FILE is None:
         base_dir = Path(__file__).resolve().parent.parent
         _BUILD_ID_FILE = base_dir / "BUILD_ID"
     build_id_file = _BUILD_ID_FILE
-    if build_id_file.exists():
-        try:
-            mtime = build_id_file.stat().st_mtime
-        except OSError:
-            mtime = None
-        if mtime is not None and _CACHED_BUILD_ID and _CACHED_MTIME == mtime:
+    try:
+        mtime = build_id_file.stat().st_mtime
+    except OSError:
+        mtime = None  # missing or unreadable
+    if mtime is not None:
+        if _CACHED_BUILD_ID and _CACHED_MTIME == mtime:
             return _CACHED_BUILD_ID
         try:
             value = build_id_file.read_text(encoding="utf-8").strip()
@@ -51,4 +50,25 @@ def get_build_id() -> str:
     return "dev"
 
 
+def get_build_id() -> str:
+    """
+    Return build id string for deployment verification.
+
+    Priority:
+    1) BUILD_ID file in project root (next to manage.py)
+    2) env BUILD_ID
+    3) "dev" fallback
+
+    The resolved value is reused for _RECHECK_SECONDS, so per-request callers
+    (X-Build-ID middleware, templates) don't stat() the file every time.
+    """
+    global _RESOLVED_BUILD_ID, _LAST_CHECK
+    now = time.monotonic()
+    if _RESOLVED_BUILD_ID is not None and now - _LAST_CHECK < _RECHECK_SECONDS:
+        return _RESOLVED_BUILD_ID
+    _RESOLVED_BUILD_ID = _read_build_id()
+    _LAST_CHECK = now
+    return _RESOLVED_BUILD_ID
+
+
 BUILD_ID = get_build_id()
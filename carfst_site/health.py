@@ -1,16 +1,19 @@
-import copy
+import importlib.util
 import logging
 import os
+import stat
 import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import django
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import caches
 from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
 from django.db.migrations.executor import MigrationExecutor
-from django.db.models import Count
-from django.db.models.functions import Lower
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
 from django.http import HttpRequest, JsonResponse
 from django.utils.timezone import now
 from django.views.decorators.cache import never_cache
@@ -23,6 +26,9 @@ logger = logging.getLogger(__name__)
 _orphaned_media_cache_fallback: Dict[str, Tuple[Dict[str, Any], float]] = {}
 ORPHANED_MEDIA_CACHE_KEY = "health_orphaned_media"
 
+# (signature, unapplied) from the last migration plan inspection
+_migrations_check_cache: Optional[Tuple[Tuple[Any, ...], List[str]]] = None
+
 
 def _check_database() -> str | None:
     try:
@@ -33,20 +39,80 @@ def _check_database() -> str | None:
     return None
 
 
+def _migrations_signature(connection) -> Tuple[Any, ...]:
+    """Cheap fingerprint: mtimes of the migrations directories + django_migrations row stats."""
+    mtimes = []
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except ImportError:
+            continue
+        if spec is None or not spec.submodule_search_locations:
+            continue
+        for location in spec.submodule_search_locations:
+            mtimes.append(os.stat(location).st_mtime_ns)
+    table = connection.ops.quote_name(MigrationRecorder.Migration._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*), MAX(id) FROM {table}")
+        applied = tuple(cursor.fetchone())
+    return (tuple(mtimes), applied)
+
+
 def _check_unapplied_migrations() -> List[str]:
+    global _migrations_check_cache
     connection = connections[DEFAULT_DB_ALIAS]
+    # Building the migration graph is expensive; reuse the last plan while neither
+    # the migration files nor the applied-migrations table have changed.
+    try:
+        signature = _migrations_signature(connection)
+    except (OSError, DatabaseError):
+        signature = None
+    if signature is not None and _migrations_check_cache is not None:
+        cached_signature, cached_unapplied = _migrations_check_cache
+        if cached_signature == signature:
+            return list(cached_unapplied)
+
     executor = MigrationExecutor(connection)
     plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
-    return [f"{migration.app_label}.{migration.name}" for migration, _ in plan]
+    unapplied = [f"{migration.app_label}.{migration.name}" for migration, _ in plan]
+    if signature is not None:
+        _migrations_check_cache = (signature, unapplied)
+    return list(unapplied)
+
+
+def _probe_dir(path: Path, need_write: bool = False) -> str | None:
+    """
+    One stat() for existence and type (instead of exists() + is_dir()).
+    Returns "missing", "not a directory", "not writable" or None.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    if not stat.S_ISDIR(st.st_mode):
+        return "not a directory"
+    if need_write and not os.access(path, os.W_OK):
+        return "not writable"
+    return None
 
 
 def _check_static_root() -> str | None:
     static_root = Path(settings.STATIC_ROOT)
-    if not static_root.exists():
+    problem = _probe_dir(static_root)
+    if problem == "missing":
         return "STATIC_ROOT is missing; run collectstatic."
-    if not static_root.is_dir():
-        return "STATIC_ROOT is not a directory."
-    if not any(static_root.glob("*")):
+    if problem:
+        return f"STATIC_ROOT is {problem}."
+    # Stop at the first entry instead of listing the whole directory
+    try:
+        with os.scandir(static_root) as entries:
+            is_empty = next(entries, None) is None
+    except OSError:
+        is_empty = True
+    if is_empty:
         return "STATIC_ROOT is empty; run collectstatic."
     if not os.access(static_root, os.R_OK):
         return "STATIC_ROOT is not readable."
@@ -54,30 +120,33 @@ def _check_static_root() -> str | None:
 
 
 def _check_media_root() -> str | None:
-    media_root = Path(settings.MEDIA_ROOT)
-    if not media_root.exists():
-        return "MEDIA_ROOT is missing."
-    if not media_root.is_dir():
-        return "MEDIA_ROOT is not a directory."
-    if not os.access(media_root, os.W_OK):
-        return "MEDIA_ROOT is not writable."
-    return None
+    problem = _probe_dir(Path(settings.MEDIA_ROOT), need_write=True)
+    return f"MEDIA_ROOT is {problem}." if problem else None
+
+
+_SLUG_DUPLICATE_MODELS = (Series, Category, Product)
 
 
 def _check_slug_duplicates() -> Dict[str, List[str]]:
-    duplicates: Dict[str, List[str]] = {}
-    for model, field in (
-        (Series, "slug"),
-        (Category, "slug"),
-        (Product, "slug"),
-    ):
-        rows = (
-            model.objects.values(lower=Lower(field))
-            .annotate(count=Count("id"))
-            .filter(count__gt=1)
+    # One UNION ALL round-trip instead of a GROUP BY query per model
+    connection = connections[DEFAULT_DB_ALIAS]
+    quote_name = connection.ops.quote_name
+    selects = []
+    for index, model in enumerate(_SLUG_DUPLICATE_MODELS):
+        slug_column = quote_name(model._meta.get_field("slug").column)
+        selects.append(
+            f"SELECT {index}, LOWER({slug_column}) FROM {quote_name(model._meta.db_table)} "
+            f"GROUP BY LOWER({slug_column}) HAVING COUNT(*) > 1"
         )
-        if rows:
-            duplicates[model._meta.label_lower] = [row["lower"] for row in rows if row["lower"]]
+    with connection.cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(selects))
+        rows = cursor.fetchall()
+
+    duplicates: Dict[str, List[str]] = {}
+    for index, lower in rows:
+        slugs = duplicates.setdefault(_SLUG_DUPLICATE_MODELS[index]._meta.label_lower, [])
+        if lower:
+            slugs.append(lower)
     return duplicates
 
 
@@ -89,16 +158,13 @@ def _get_orphaned_media_cached(ttl_seconds: int) -> Optional[Tuple[Dict[str, Any
     """Return (payload, stored_at) or None. Uses Django cache with in-process fallback."""
     try:
         cache = caches["default"]
-        payload = cache.get(ORPHANED_MEDIA_CACHE_KEY)
-        if payload is None:
-            return None
-        stored_at = payload.get("_stored_at")
-        if stored_at is None:
+        entry = cache.get(ORPHANED_MEDIA_CACHE_KEY)
+        if not isinstance(entry, tuple):
             return None
+        stored_at, missing_files, unreferenced_files = entry
         if time.time() - stored_at > ttl_seconds:
             return None
-        result = {k: v for k, v in payload.items() if k != "_stored_at"}
-        return (result, stored_at)
+        return ({"missing_files": missing_files, "unreferenced_files": unreferenced_files}, stored_at)
     except Exception:
         entry = _orphaned_media_cache_fallback.get(ORPHANED_MEDIA_CACHE_KEY)
         if entry is None:
@@ -111,26 +177,32 @@ def _get_orphaned_media_cached(ttl_seconds: int) -> Optional[Tuple[Dict[str, Any
 
 
 def _set_orphaned_media_cached(payload: Dict[str, Any], ttl_seconds: int) -> None:
-    """Store payload with current timestamp. Uses Django cache with in-process fallback."""
+    """
+    Store payload with current timestamp. Uses Django cache with in-process fallback.
+
+    The cached value is a compact (stored_at, missing_files, unreferenced_files) tuple.
+    """
     stored_at = time.time()
-    to_store = {**payload, "_stored_at": stored_at}
+    entry = (
+        stored_at,
+        payload.get("missing_files", []),
+        payload.get("unreferenced_files", []),
+    )
     try:
         cache = caches["default"]
-        cache.set(ORPHANED_MEDIA_CACHE_KEY, to_store, timeout=ttl_seconds)
+        cache.set(ORPHANED_MEDIA_CACHE_KEY, entry, timeout=ttl_seconds)
     except Exception:
         pass
-    _orphaned_media_cache_fallback[ORPHANED_MEDIA_CACHE_KEY] = (
-        {k: v for k, v in payload.items()},
-        stored_at,
-    )
+    _orphaned_media_cache_fallback[ORPHANED_MEDIA_CACHE_KEY] = (payload, stored_at)
 
 
 def _check_cache() -> str | None:
     try:
         cache = caches["default"]
         probe_key = "healthcheck_ping"
-        cache.set(probe_key, "pong", timeout=5)
-        if cache.get(probe_key) != "pong":
+        # add() is acknowledged by the backend, so a successful insert proves the write
+        # in one round-trip; if a recent probe is still cached, read it back instead.
+        if not cache.add(probe_key, "pong", timeout=5) and cache.get(probe_key) != "pong":
             return "Cache read/write validation failed."
     except Exception as exc:  # pragma: no cover - defensive
         return str(exc)
@@ -138,14 +210,8 @@ def _check_cache() -> str | None:
 
 
 def _check_log_dir() -> str | None:
-    log_dir = Path(settings.LOG_DIR)
-    if not log_dir.exists():
-        return "LOG_DIR is missing."
-    if not log_dir.is_dir():
-        return "LOG_DIR is not a directory."
-    if not os.access(log_dir, os.W_OK):
-        return "LOG_DIR is not writable."
-    return None
+    problem = _probe_dir(Path(settings.LOG_DIR), need_write=True)
+    return f"LOG_DIR is {problem}." if problem else None
 
 
 def _build_check(status: str, detail: Any | None = None) -> Dict[str, Any]:
@@ -298,7 +364,7 @@ def run_health_checks(request: Optional[HttpRequest] = None) -> Dict[str, Any]:
         "checks": checks,
         "meta": {
             "service": getattr(settings, "SITE_DOMAIN", ""),
-            "django_version": getattr(settings, "DJANGO_VERSION_STR", ""),
+            "django_version": django.get_version(),
             "debug": settings.DEBUG,
             "timestamp": now().isoformat(),
         },
@@ -309,7 +375,6 @@ def run_health_checks(request: Optional[HttpRequest] = None) -> Dict[str, Any]:
     if isinstance(orphan_detail, dict) and (
         orphan_detail.get("missing_files") or orphan_detail.get("unreferenced_files")
     ):
-        log_report = copy.deepcopy(report)
         missing = orphan_detail.get("missing_files") or []
         unreferenced = orphan_detail.get("unreferenced_files") or []
         sample = 5
@@ -323,7 +388,14 @@ def run_health_checks(request: Optional[HttpRequest] = None) -> Dict[str, Any]:
             summary["cached"] = orphan_detail["cached"]
         if "cache_age_seconds" in orphan_detail:
             summary["cache_age_seconds"] = orphan_detail["cache_age_seconds"]
-        log_report["checks"]["orphaned_media"]["detail"] = summary
+        # Shallow copies along the path to the summary; other checks are shared, not copied
+        log_report = {
+            **report,
+            "checks": {
+                **checks,
+                "orphaned_media": {**checks["orphaned_media"], "detail": summary},
+            },
+        }
 
     if status == "ok":
         logger.debug("Health check report: %s", report)
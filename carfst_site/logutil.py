@@ -0,0 +1,72 @@
+"""
+Logging helpers referenced from settings.LOGGING.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class MkdirRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that creates the log directory when it is constructed (dictConfig
+    builds it during django.setup()), so a fresh deploy with LOG_TO_FILE has LOG_DIR in
+    place before anything is logged; the health check reports a missing LOG_DIR.
+    With delay=True the file itself is only opened on the first write.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, *args, **kwargs)
+
+
+class QueuedRotatingFileHandler(logging.Handler):
+    """
+    Hands records to a background thread that writes them with MkdirRotatingFileHandler,
+    so request threads don't block on file writes or rollover renames.
+    Takes the same arguments as RotatingFileHandler.
+
+    This is a plain Handler that owns its QueueHandler and QueueListener: on Python 3.12+
+    dictConfig treats QueueHandler subclasses specially and insists on a "handlers" list.
+
+    The listener thread is started per process on first use: a gunicorn worker forked
+    from a master that already configured logging gets its own queue and thread.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__()
+        self.target = MkdirRotatingFileHandler(filename, **kwargs)
+        self._queue_handler = QueueHandler(queue.SimpleQueue())
+        self._listener: QueueListener | None = None
+        self._listener_pid: int | None = None
+
+    def setFormatter(self, fmt):
+        # Records are formatted in the calling thread by QueueHandler.prepare()
+        super().setFormatter(fmt)
+        self._queue_handler.setFormatter(fmt)
+
+    def emit(self, record):
+        # Called from Handler.handle() with self.lock held
+        if self._listener_pid != os.getpid():
+            self._queue_handler.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self._queue_handler.queue, self.target)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+            atexit.register(self._stop_listener)
+        self._queue_handler.emit(record)
+
+    def _stop_listener(self):
+        listener = self._listener
+        if listener is not None and self._listener_pid == os.getpid():
+            self._listener = None
+            self._listener_pid = None
+            listener.stop()  # drains the queue
+
+    def close(self):
+        self._stop_listener()
+        self.target.close()
+        self._queue_handler.close()
+        super().close()
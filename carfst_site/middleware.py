@@ -1,19 +1,70 @@
+import functools
 import logging
 import re
-import uuid
-from pathlib import Path
+from os import urandom
 from typing import Callable
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.core.files.uploadedfile import UploadedFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest
 from django.http.multipartparser import MultiPartParserError
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import empty
 
 from carfst_site.build_id import get_build_id
 
 logger = logging.getLogger("request_errors")
 
+# Byte marker (besides "{#", "#}" and "###") that makes TemplateArtifactCleanupMiddleware
+# rewrite a response.
+_PLACEHOLDER_MARKER = b"Inline SVG placeholder"
+
+# Permissions-Policy (formerly Feature-Policy)
+# Restrict access to browser features for security
+# Using a restrictive policy by default
+_PERMISSIONS_POLICY = (
+    "accelerometer=(), "
+    "autoplay=(), "
+    "camera=(), "
+    "cross-origin-isolated=(), "
+    "display-capture=(), "
+    "encrypted-media=(), "
+    "fullscreen=(), "
+    "geolocation=(), "
+    "gyroscope=(), "
+    "magnetometer=(), "
+    "microphone=(), "
+    "midi=(), "
+    "payment=(), "
+    "picture-in-picture=(), "
+    "publickey-credentials-get=(), "
+    "screen-wake-lock=(), "
+    "sync-xhr=(), "
+    "usb=(), "
+    "web-share=(), "
+    "xr-spatial-tracking=()"
+)
+
+# Headers for admin/staff (no-store) and admin/lead (noindex) pages
+_NO_STORE_CACHE_CONTROL = "no-store, no-cache, must-revalidate, private"
+_NOINDEX_ROBOTS_TAG = "noindex, nofollow"
+
+
+def _resolved_user_id(request: HttpRequest):
+    """
+    Primary key of request.user if it has already been loaded, else None.
+    Logging must not trigger the lazy session/DB lookup (it would also fail under async).
+    """
+    user = getattr(request, "user", None)
+    if user is None or getattr(user, "_wrapped", None) is empty:
+        return None
+    return getattr(user, "pk", None)
 
+
+@sync_and_async_middleware
 class ErrorLoggingMiddleware:
     """
     Adds a request id to each request/response and writes errors to logs/errors.log.
@@ -21,55 +72,83 @@ class ErrorLoggingMiddleware:
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id = request.headers.get("X-Request-ID") or urandom(16).hex()
         request.request_id = request_id
-        request.META["HTTP_X_REQUEST_ID"] = request_id
 
         try:
             response = self.get_response(request)
         except Exception:
-            logger.exception(
-                "Unhandled exception",
-                extra={
-                    "request_id": request_id,
-                    "path": request.path,
-                    "method": request.method,
-                    "user": getattr(request, "user", None),
-                },
-            )
+            logger.exception("Unhandled exception", extra=self._log_extra(request, request_id))
             raise
 
+        return self._process_response(request, response, request_id)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        request_id = request.headers.get("X-Request-ID") or urandom(16).hex()
+        request.request_id = request_id
+
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            logger.exception("Unhandled exception", extra=self._log_extra(request, request_id))
+            raise
+
+        return self._process_response(request, response, request_id)
+
+    def _process_response(
+        self, request: HttpRequest, response: HttpResponse, request_id: str
+    ) -> HttpResponse:
         response["X-Request-ID"] = request_id
-        if response.status_code >= 500:
+        # Build the extras only when the record will actually be emitted
+        if response.status_code >= 500 and logger.isEnabledFor(logging.ERROR):
             logger.error(
                 "Response with %s",
                 response.status_code,
-                extra={
-                    "request_id": request_id,
-                    "path": request.path,
-                    "method": request.method,
-                    "user": getattr(request, "user", None),
-                },
+                extra=self._log_extra(request, request_id),
             )
         return response
 
+    @staticmethod
+    def _log_extra(request: HttpRequest, request_id: str) -> dict:
+        return {
+            "request_id": request_id,
+            "path": request.path,
+            "method": request.method,
+            "user_id": _resolved_user_id(request),
+        }
 
-class BuildIdHeaderMiddleware:
-    """
-    Adds X-Build-ID header to every response for diagnostics.
-    """
 
-    def __init__(self, get_response: Callable):
-        self.get_response = get_response
+@functools.lru_cache(maxsize=1)
+def _upload_limits() -> tuple[frozenset[str], frozenset[str], int]:
+    """Allowed extensions, allowed MIME types and max size, read from settings once."""
+    return (
+        frozenset(ext.lower().lstrip(".") for ext in settings.MEDIA_ALLOWED_IMAGE_EXTENSIONS),
+        frozenset(mime.lower() for mime in settings.MEDIA_ALLOWED_IMAGE_MIME_TYPES),
+        settings.MAX_IMAGE_SIZE,
+    )
 
-    def __call__(self, request: HttpRequest) -> HttpResponse:
-        response = self.get_response(request)
-        response["X-Build-ID"] = get_build_id()
-        return response
+
+@receiver(setting_changed)
+def _reset_upload_limits(*, setting, **kwargs):
+    if setting in {"MEDIA_ALLOWED_IMAGE_EXTENSIONS", "MEDIA_ALLOWED_IMAGE_MIME_TYPES", "MAX_IMAGE_SIZE"}:
+        _upload_limits.cache_clear()
 
 
+def _file_extension(name: str) -> str:
+    """Lowercased extension without the dot, same as Path(name).suffix for upload basenames."""
+    index = name.rfind(".")
+    if 0 < index < len(name) - 1:
+        return name[index + 1:].lower()
+    return ""
+
+
+@sync_and_async_middleware
 class UploadValidationMiddleware:
     """
     Rejects uploads that exceed size limits or use disallowed formats.
@@ -77,9 +156,24 @@ class UploadValidationMiddleware:
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        if request.method in {"POST", "PUT", "PATCH"}:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._reject_upload(request) or self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self._reject_upload(request) or await self.get_response(request)
+
+    def _reject_upload(self, request: HttpRequest) -> HttpResponse | None:
+        # Only multipart bodies can carry files; skip JSON/form posts and empty bodies
+        if (
+            request.method in {"POST", "PUT", "PATCH"}
+            and request.content_type == "multipart/form-data"
+            and request.META.get("CONTENT_LENGTH") not in (None, "", "0")
+        ):
             try:
                 files = request.FILES
             except MultiPartParserError:
@@ -101,18 +195,16 @@ class UploadValidationMiddleware:
                     )
                     return HttpResponseBadRequest(failure)
 
-        return self.get_response(request)
+        return None
 
     def _validate_file(self, uploaded_file: UploadedFile) -> str | None:
-        allowed_extensions = {ext.lower().lstrip(".") for ext in settings.MEDIA_ALLOWED_IMAGE_EXTENSIONS}
-        allowed_mime_types = {mime.lower() for mime in settings.MEDIA_ALLOWED_IMAGE_MIME_TYPES}
-        max_size_bytes = settings.MAX_IMAGE_SIZE
+        allowed_extensions, allowed_mime_types, max_size_bytes = _upload_limits()
 
         file_size = getattr(uploaded_file, "size", None)
         if max_size_bytes and file_size is not None and file_size > max_size_bytes:
             return f"File '{uploaded_file.name}' exceeds maximum size of {max_size_bytes} bytes."
 
-        extension = Path(uploaded_file.name or "").suffix.lower().lstrip(".")
+        extension = _file_extension(uploaded_file.name or "")
         content_type = (getattr(uploaded_file, "content_type", "") or "").lower()
 
         if extension and extension not in allowed_extensions:
@@ -127,113 +219,82 @@ class UploadValidationMiddleware:
         return None
 
 
-class SecurityHeadersMiddleware:
+@sync_and_async_middleware
+class ResponseDecoratorMiddleware:
     """
-    Adds additional security headers: Permissions-Policy, CSP Report-Only.
+    Adds the per-response headers in one pass: X-Build-ID for diagnostics,
+    Permissions-Policy and CSP Report-Only, Cache-Control: no-store for admin pages
+    and X-Robots-Tag: noindex, nofollow for admin and lead pages.
     Should be placed after SecurityMiddleware in MIDDLEWARE list.
     """
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
-        # CSP Report-Only configuration from settings
-        self.csp_report_only = getattr(settings, "CSP_REPORT_ONLY", False)
-        self.csp_report_uri = getattr(settings, "CSP_REPORT_URI", None)
-        self.csp_policy = getattr(settings, "CSP_POLICY", None)
-
-    def __call__(self, request: HttpRequest) -> HttpResponse:
-        response = self.get_response(request)
-        
-        # Permissions-Policy (formerly Feature-Policy)
-        # Restrict access to browser features for security
-        # Using a restrictive policy by default
-        permissions_policy = (
-            "accelerometer=(), "
-            "autoplay=(), "
-            "camera=(), "
-            "cross-origin-isolated=(), "
-            "display-capture=(), "
-            "encrypted-media=(), "
-            "fullscreen=(), "
-            "geolocation=(), "
-            "gyroscope=(), "
-            "magnetometer=(), "
-            "microphone=(), "
-            "midi=(), "
-            "payment=(), "
-            "picture-in-picture=(), "
-            "publickey-credentials-get=(), "
-            "screen-wake-lock=(), "
-            "sync-xhr=(), "
-            "usb=(), "
-            "web-share=(), "
-            "xr-spatial-tracking=()"
-        )
-        response["Permissions-Policy"] = permissions_policy
-        
+        self.permissions_policy = _PERMISSIONS_POLICY
         # Content-Security-Policy Report-Only (safe mode, doesn't block resources)
-        if self.csp_report_only and self.csp_policy:
-            header_name = "Content-Security-Policy-Report-Only"
-            csp_value = self.csp_policy
-            if self.csp_report_uri:
-                csp_value = f"{csp_value}; report-uri {self.csp_report_uri}"
-            response[header_name] = csp_value
-        
-        return response
-
-
-class AdminCacheControlMiddleware:
-    """
-    Adds Cache-Control: no-store for admin pages to prevent caching of sensitive content.
-    """
-
-    def __init__(self, get_response: Callable):
-        self.get_response = get_response
+        self.csp_value = None
+        csp_policy = getattr(settings, "CSP_POLICY", None)
+        if getattr(settings, "CSP_REPORT_ONLY", False) and csp_policy:
+            csp_report_uri = getattr(settings, "CSP_REPORT_URI", None)
+            self.csp_value = (
+                f"{csp_policy}; report-uri {csp_report_uri}" if csp_report_uri else csp_policy
+            )
         admin_prefix = settings.ADMIN_URL.rstrip("/")
         self.admin_prefix = admin_prefix if admin_prefix else "admin"
         # Paths that should have no-store cache control
-        self.no_cache_paths = [self.admin_prefix, "adminlogin/", "staff/"]
+        self.no_cache_paths = (self.admin_prefix, "adminlogin/", "staff/")
+        # Paths that should have noindex
+        self.noindex_paths = (*self.no_cache_paths, "lead/")
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._process_response(request, self.get_response(request))
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self._process_response(request, await self.get_response(request))
+
+    def _process_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        response["X-Build-ID"] = get_build_id()
+        response["Permissions-Policy"] = self.permissions_policy
+        if self.csp_value:
+            response["Content-Security-Policy-Report-Only"] = self.csp_value
         
-        # Check if path starts with any admin prefix
+        # Every no-cache prefix is also a noindex prefix, so test the wider set first
         path = request.path.lstrip("/")
-        for prefix in self.no_cache_paths:
-            if path.startswith(prefix):
+        if path.startswith(self.noindex_paths):
+            response["X-Robots-Tag"] = _NOINDEX_ROBOTS_TAG
+            if path.startswith(self.no_cache_paths):
                 # Prevent caching of admin pages
-                response["Cache-Control"] = "no-store, no-cache, must-revalidate, private"
+                response["Cache-Control"] = _NO_STORE_CACHE_CONTROL
                 response["Pragma"] = "no-cache"
                 response["Expires"] = "0"
-                break
         
         return response
 
 
-class RobotsNoIndexMiddleware:
+def _has_artifact_markers(raw: bytes) -> bool:
     """
-    Adds X-Robots-Tag: noindex, nofollow header for admin and lead pages.
+    True if raw contains "{#", "#}", "###" or the SVG placeholder text.
+    Every hash marker contains "#", and pages have only a few of them, so one walk over the
+    "#" positions replaces a separate substring scan per marker.
     """
-
-    def __init__(self, get_response: Callable):
-        self.get_response = get_response
-        admin_prefix = settings.ADMIN_URL.rstrip("/")
-        self.admin_prefix = admin_prefix if admin_prefix else "admin"
-        # Paths that should have noindex
-        self.noindex_paths = [self.admin_prefix, "adminlogin/", "staff/", "lead/"]
-
-    def __call__(self, request: HttpRequest) -> HttpResponse:
-        response = self.get_response(request)
-        
-        # Check if path starts with any noindex prefix
-        path = request.path.lstrip("/")
-        for prefix in self.noindex_paths:
-            if path.startswith(prefix):
-                response["X-Robots-Tag"] = "noindex, nofollow"
-                break
-        
-        return response
-
-
+    find = raw.find
+    index = find(b"#")
+    while index != -1:
+        if (
+            raw[index - 1:index] == b"{"
+            or raw[index + 1:index + 2] == b"}"
+            or raw[index + 1:index + 3] == b"##"
+        ):
+            return True
+        index = find(b"#", index + 1)
+    return _PLACEHOLDER_MARKER in raw
+
+
+@sync_and_async_middleware
 class TemplateArtifactCleanupMiddleware:
     """
     Removes Django template comments and artifacts from HTML responses.
@@ -244,13 +305,20 @@ class TemplateArtifactCleanupMiddleware:
     def __init__(self, get_response: Callable):
         self.get_response = get_response
         # Compile regex patterns once
-        self.django_comment_pattern = re.compile(r'\{#.*?#\}', re.DOTALL)
-        # Pattern for standalone lines with 3+ hashes: ^\s*#{3,}\s*$
-        self.standalone_hashes_pattern = re.compile(r'(?m)^\s*#{3,}\s*$\n?')
-        # Pattern for markdown headers at start of line: ^\s*#{3,}\s+.*?$
-        self.markdown_header_pattern = re.compile(r'(?m)^\s*#{3,}\s+.*?$', re.MULTILINE)
-        self.placeholder_pattern = re.compile(
-            r'Inline\s+SVG\s+placeholder(?:\s+for\s+cases\s+when\s+product\s+has\s+no\s+images)?',
+        # All artifacts in one alternation, removed in a single pass. At each position the
+        # alternatives are tried in order:
+        # - Django template comments {# ... #}, then unclosed comment markers {# / #}
+        # - markdown headers at start of line (3+ hashes + text, e.g. "##### Преимущество")
+        # - standalone lines of 3+ hashes, with their newline
+        # - runs of 3+ hashes anywhere else ("##### Преимущество" -> "Преимущество")
+        # - placeholder text
+        self.artifact_pattern = re.compile(
+            r'(?s:\{#.*?#\})'
+            r'|\{#|#\}'
+            r'|(?m:^[ \t]*#{3,}[ \t]+[^\n]*)'
+            r'|(?m:^[ \t]*#{3,}[ \t]*(?:\n|$))'
+            r'|#{3,}\s*'
+            r'|Inline\s+SVG\s+placeholder(?:\s+for\s+cases\s+when\s+product\s+has\s+no\s+images)?',
             re.IGNORECASE
         )
         # Pattern to extract script/style blocks
@@ -258,29 +326,41 @@ class TemplateArtifactCleanupMiddleware:
             r'(<script[^>]*>.*?</script>|<style[^>]*>.*?</style>)',
             re.DOTALL | re.IGNORECASE
         )
+        # Whitespace cleanup: spaces/tabs around newlines, then remaining space/tab runs
+        self.newline_space_pattern = re.compile(r'[ \t]*\n[ \t]*')
+        self.space_run_pattern = re.compile(r'[ \t]+')
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._process_response(self.get_response(request))
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self._process_response(await self.get_response(request))
+
+    def _process_response(self, response: HttpResponse) -> HttpResponse:
+        # Skip streaming responses (reading them would consume the iterator) and bodiless statuses
+        if response.streaming or response.status_code in (204, 304):
+            return response
         
         # Only process text/html responses
         content_type = response.get("Content-Type", "").lower()
         if not content_type.startswith("text/html"):
             return response
         
-        # Check if response has content and if markers are present (minimal risk)
-        if not hasattr(response, "content") or not response.content:
-            return response
-        
-        content_str = response.content.decode("utf-8", errors="ignore")
+        # Check if markers are present (minimal risk)
+        raw = response.content
         
-        # Only process if markers are detected
-        has_django_comment = "{#" in content_str or "#}" in content_str
-        # Check for markdown header artifacts (3+ hash symbols, including "#####") and placeholder text
-        has_artifacts = "Inline SVG placeholder" in content_str or "###" in content_str or "#####" in content_str
-        
-        if not (has_django_comment or has_artifacts):
+        # Only process if markers are detected: Django comment markers, 3+ hash symbols
+        # (markdown header artifacts, including "#####") or placeholder text.
+        # Checked on the raw bytes so clean pages are never decoded.
+        if not _has_artifact_markers(raw):
             return response
         
+        content_str = raw.decode("utf-8", errors="ignore")
+        
         # Protect script/style blocks: extract them temporarily
         protected_blocks = []
         placeholder_prefix = "___PROTECTED_BLOCK_"
@@ -296,23 +376,11 @@ class TemplateArtifactCleanupMiddleware:
         # Extract script/style blocks
         content_str = self.script_style_pattern.sub(replace_block, content_str)
         
-        # Remove Django template comments: {# ... #}
-        if has_django_comment:
-            content_str = self.django_comment_pattern.sub("", content_str)
-            # Also remove unclosed comment markers
-            content_str = content_str.replace("{#", "").replace("#}", "")
-        
-        # Remove artifact strings (excluding protected blocks)
-        if has_artifacts:
-            # Remove markdown headers (3+ hash symbols + text at start of line, including "##### Преимущество")
-            content_str = self.markdown_header_pattern.sub("", content_str)
-            # Remove standalone hash lines (3+ hash symbols on separate lines)
-            content_str = self.standalone_hashes_pattern.sub("", content_str)
-            # Remove sequences of 3+ hashes anywhere in text (markdown header artifacts, including "#####")
-            # This will remove "#####" from "##### Преимущество" leaving just "Преимущество"
-            content_str = re.sub(r'#{3,}\s*', '', content_str)
-            # Remove placeholder text
-            content_str = self.placeholder_pattern.sub("", content_str)
+        # Remove comments, markers, hash artifacts and placeholder text (excluding protected blocks)
+        content_str, removed = self.artifact_pattern.subn("", content_str)
+        if not removed:
+            # Markers only inside <script>/<style>: leave the response untouched
+            return response
         
         # Restore protected blocks
         for i, block in enumerate(protected_blocks):
@@ -321,13 +389,16 @@ class TemplateArtifactCleanupMiddleware:
         
         # Clean up extra whitespace that might result from removals (but preserve newlines)
         # Only collapse multiple spaces/tabs into single space, preserve line breaks
-        content_str = re.sub(r'[ \t]+', ' ', content_str)
-        content_str = re.sub(r' *\n *', '\n', content_str)
+        # Trimming around newlines first leaves fewer runs for the collapse pass
+        content_str = self.newline_space_pattern.sub('\n', content_str)
+        content_str = self.space_run_pattern.sub(' ', content_str)
         
         # Update response content
-        response.content = content_str.encode("utf-8")
-        # Update Content-Length if present
+        body = content_str.encode("utf-8")
+        response.content = body
+        # A Content-Length set by the view is now stale; otherwise CommonMiddleware adds it later.
+        # Measure the local bytes: reading response.content back joins a fresh copy.
         if "Content-Length" in response:
-            response["Content-Length"] = str(len(response.content))
+            response["Content-Length"] = str(len(body))
         
         return response
@@ -9,6 +9,7 @@ Does not redirect localhost/127.0.0.1 for local development.
 
 from typing import Callable
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.core.exceptions import DisallowedHost
 from django.http import (
@@ -17,8 +18,10 @@ from django.http import (
     HttpResponseBadRequest,
     HttpResponsePermanentRedirect,
 )
+from django.utils.decorators import sync_and_async_middleware
 
 
+@sync_and_async_middleware
 class CanonicalHostMiddleware:
     """
     Redirects to canonical host if request host is in allowed variants but not canonical.
@@ -31,46 +34,66 @@ class CanonicalHostMiddleware:
     def __init__(self, get_response: Callable):
         self.get_response = get_response
         self.canonical_host = getattr(settings, "CANONICAL_HOST", "carfst.ru")
+        self.canonical_https_base = f"https://{self.canonical_host}"
+        self.canonical_http_base = f"http://{self.canonical_host}"
+        # With X-Forwarded-Host trusted, get_host() may differ from the raw Host header
+        self.raw_host_is_host = not getattr(settings, "USE_X_FORWARDED_HOST", False)
         self.allowed_variants = getattr(
             settings,
             "ALLOWED_HOST_VARIANTS",
             ["carfst.ru", "www.carfst.ru"],
         )
+        # ALLOWED_HOSTS split into exact names and ".domain" suffix patterns
+        allowed_hosts = [h.lower() for h in getattr(settings, "ALLOWED_HOSTS", [])]
+        self.allowed_wildcard = "*" in allowed_hosts
+        self.allowed_exact = frozenset(allowed_hosts)
+        self.allowed_suffixes = tuple(h for h in allowed_hosts if h.startswith("."))
+        # sitemap/robots are served for any host (with or without trailing slash)
+        self.safe_exact = frozenset(("/sitemap.xml", "/robots.txt"))
+        self.safe_prefixes = ("/sitemap-", "/robots")
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _is_allowed_host(self, host: str) -> bool:
+        if not host:
+            return False
+        return (
+            self.allowed_wildcard
+            or host in self.allowed_exact
+            or host.endswith(self.allowed_suffixes)
+        )
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._redirect_or_reject(request) or self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self._redirect_or_reject(request) or await self.get_response(request)
+
+    def _redirect_or_reject(self, request: HttpRequest) -> HttpResponse | None:
         path = request.path_info or request.path or ""
-        safe = (
-            path in ("/sitemap.xml", "/robots.txt")
-            or path.rstrip("/") in ("/sitemap.xml", "/robots.txt")
-            or path.startswith(("/sitemap-", "/robots"))
-        )
+        safe = path.rstrip("/") in self.safe_exact or path.startswith(self.safe_prefixes)
         raw_host = (
             request.META.get("HTTP_HOST")
             or request.META.get("SERVER_NAME")
             or ""
         ).split(":")[0].lower()
-        allowed_hosts = [h.lower() for h in getattr(settings, "ALLOWED_HOSTS", [])]
-
-        def _is_allowed_host(host: str) -> bool:
-            if not host:
-                return False
-            if "*" in allowed_hosts:
-                return True
-            for pattern in allowed_hosts:
-                if pattern == host:
-                    return True
-                if pattern.startswith(".") and host.endswith(pattern):
-                    return True
-            return False
 
         if safe:
-            if not _is_allowed_host(raw_host):
+            if not self._is_allowed_host(raw_host):
                 request.META["HTTP_HOST"] = self.canonical_host
                 request.META["HTTP_X_FORWARDED_HOST"] = self.canonical_host
                 request.META["HTTP_X_FORWARDED_PROTO"] = "https"
                 request.META["wsgi.url_scheme"] = "https"
                 request.META["SERVER_PORT"] = "443"
-            return self.get_response(request)
+            return None
+        
+        # Canonical Host header (the common case): nothing to redirect. Compare the full
+        # header, port included, so malformed ports still get the quiet 400 below
+        if self.raw_host_is_host and request.META.get("HTTP_HOST") == self.canonical_host:
+            return None
+        
         try:
             host = request.get_host()
         except DisallowedHost:
@@ -79,18 +102,18 @@ class CanonicalHostMiddleware:
         
         # Skip redirect for localhost/127.0.0.1
         if host in ("localhost", "127.0.0.1") or host.startswith(("localhost:", "127.0.0.1:")):
-            return self.get_response(request)
+            return None
         
         # Skip if already canonical
         if host == self.canonical_host:
-            return self.get_response(request)
+            return None
         
         # Only redirect if host is in allowed variants
         if host not in self.allowed_variants:
-            return self.get_response(request)
+            return None
         
         # Build canonical URL
-        scheme = "https" if request.is_secure() else "http"
-        canonical_url = f"{scheme}://{self.canonical_host}{request.get_full_path()}"
+        base = self.canonical_https_base if request.is_secure() else self.canonical_http_base
+        canonical_url = base + request.get_full_path()
         
         return HttpResponsePermanentRedirect(canonical_url)
@@ -3,14 +3,10 @@ import sys
 from pathlib import Path
 from typing import Iterable
 
-import django
 import environ
 from django.utils.translation import gettext_lazy as _
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DJANGO_VERSION = django.VERSION
-DJANGO_VERSION_STR = django.get_version()
-DJANGO_IS_51_PLUS = DJANGO_VERSION >= (5, 1)
 
 
 def _unique(items: Iterable[str]) -> list[str]:
@@ -149,12 +145,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "carfst_site.middleware_canonical_host.CanonicalHostMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "carfst_site.middleware.SecurityHeadersMiddleware",
+    "carfst_site.middleware.ResponseDecoratorMiddleware",
     # Serve static files (incl. Django admin) in production without relying on nginx config.
     # Must be right after SecurityMiddleware: https://whitenoise.readthedocs.io/
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "carfst_site.middleware.ErrorLoggingMiddleware",
-    "carfst_site.middleware.BuildIdHeaderMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -163,8 +158,6 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "carfst_site.middleware.RobotsNoIndexMiddleware",
-    "carfst_site.middleware.AdminCacheControlMiddleware",
     "carfst_site.middleware.TemplateArtifactCleanupMiddleware",
 ]
 
@@ -238,9 +231,8 @@ STORAGES = {
 }
 MEDIA_URL = _ensure_trailing_slash(env("MEDIA_URL", default="/media/"), "/media/")
 MEDIA_ROOT = Path(env("MEDIA_ROOT", default=str(BASE_DIR / "media")))
+# Created by logutil.MkdirRotatingFileHandler when LOG_TO_FILE configures the file handlers
 LOG_DIR = Path(env("LOG_DIR", default=str(BASE_DIR / "logs")))
-if LOG_TO_FILE:
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
 DJANGO_LOG_FILE = LOG_DIR / "django.log"
 ERROR_LOG_FILE = LOG_DIR / "errors.log"
 
@@ -319,7 +311,7 @@ if LOG_TO_FILE:
     LOGGING_HANDLERS.update(
         {
             "django_file": {
-                "class": "logging.handlers.RotatingFileHandler",
+                "class": "carfst_site.logutil.QueuedRotatingFileHandler",
                 "formatter": "verbose",
                 "filename": str(DJANGO_LOG_FILE),
                 "maxBytes": 5 * 1024 * 1024,
@@ -327,7 +319,7 @@ if LOG_TO_FILE:
                 "delay": True,
             },
             "error_file": {
-                "class": "logging.handlers.RotatingFileHandler",
+                "class": "carfst_site.logutil.QueuedRotatingFileHandler",
                 "formatter": "verbose",
                 "filename": str(ERROR_LOG_FILE),
                 "maxBytes": 5 * 1024 * 1024,
@@ -400,11 +392,19 @@ CACHES = {
 }
 
 REDIS_URL = env("REDIS_URL", default=None)
+# Without Redis, CACHE_DIR gives all gunicorn workers one shared file-based cache
+# instead of a separate LocMemCache per worker.
+CACHE_DIR = env("CACHE_DIR", default=None)
 if REDIS_URL and not TESTING:
     CACHES["default"] = {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
         "LOCATION": REDIS_URL,
     }
+elif CACHE_DIR and not TESTING:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_DIR,
+    }
 
 SECURE_REFERRER_POLICY = "strict-origin-when-cross-origin"
 
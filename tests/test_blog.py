@@ -126,3 +126,43 @@ def test_sitemap_no_duplicate_locations(client):
     content = response.content.decode("utf-8")
     locs = re.findall(r"<loc>([^<]+)</loc>", content)
     assert len(locs) == len(set(locs))
+
+
+def test_blog_detail_schema_follows_post_update(client):
+    post = _ensure_post()
+    response = client.get(post.get_absolute_url())
+    content = response.content.decode("utf-8")
+    assert '"@type": "BlogPosting"' in content
+    assert f'"item": "http://testserver{post.get_absolute_url()}"' in content
+
+    post.title = "Обновлённый заголовок"
+    post.save()
+    content = client.get(post.get_absolute_url()).content.decode("utf-8")
+    assert '"headline": "Обновлённый заголовок"' in content
+
+
+def test_reading_time_counts_words_outside_tags():
+    from blog.views import _reading_time_minutes
+
+    assert _reading_time_minutes("") == 1
+    html = '<p class="lead text-muted">' + "слово " * 180 + "</p>"
+    assert _reading_time_minutes(html) == 1
+    assert _reading_time_minutes(html + "<p>ещё</p>") == 2
+
+
+def test_inject_images_keeps_leading_text():
+    from blog import views
+
+    if not views.HAS_LXML:
+        pytest.skip("lxml not installed")
+    image = type("Image", (), {"id": 1, "caption": "@after: Другой раздел"})()
+    html = "Вступление<h2>Раздел</h2><p>Текст</p>"
+    assert views.inject_images_into_html(html, [image]) == (html, [])
+
+
+def test_inject_images_without_anchors_returns_html_untouched():
+    from blog import views
+
+    image = type("Image", (), {"id": 1, "caption": "Обычная подпись"})()
+    html = "<h2>Раздел<p>Незакрытый тег"
+    assert views.inject_images_into_html(html, [image]) == (html, [])
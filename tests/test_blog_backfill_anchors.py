@@ -0,0 +1,54 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+
+from blog.models import BlogPost, BlogPostImage
+
+
+pytestmark = pytest.mark.django_db
+
+SLUG = "utechka-vozduha-i-padaet-davlenie-diagnostika-pnevmosistemy"
+
+
+def _make_post(tmp_path, settings):
+    settings.MEDIA_ROOT = tmp_path
+    post = BlogPost.objects.create(
+        title="Утечка воздуха",
+        slug=SLUG,
+        excerpt="Описание",
+        content_html="<p>Контент</p>",
+        is_published=True,
+        published_at=timezone.now(),
+    )
+    for index in (2, 3, 9):
+        BlogPostImage.objects.create(
+            post=post,
+            image=SimpleUploadedFile(
+                f"utechka-vozduha_{index}_x.png", b"file", content_type="image/png"
+            ),
+            caption="Подпись" if index == 3 else "",
+            sort_order=index,
+        )
+    return post
+
+
+def test_backfill_anchors_updates_captions(tmp_path, settings):
+    post = _make_post(tmp_path, settings)
+
+    call_command("backfill_blog_image_anchors", "--slugs", SLUG)
+
+    captions = list(post.images.order_by("sort_order").values_list("caption", flat=True))
+    assert captions == [
+        "@after: Визуальный осмотр",
+        "@after: Соединения, шланги, фитинги | Подпись",
+        "",
+    ]
+
+
+def test_backfill_anchors_dry_run_keeps_captions(tmp_path, settings):
+    post = _make_post(tmp_path, settings)
+
+    call_command("backfill_blog_image_anchors", "--slugs", SLUG, "--dry-run")
+
+    assert not post.images.filter(caption__contains="@after:").exists()
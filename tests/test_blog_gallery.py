@@ -28,3 +28,59 @@ def test_blog_gallery_renders_images(client, tmp_path, settings):
     assert response.status_code == 200
     assert 'data-blog-gallery' in content
     assert content.count("<img") >= 2
+
+
+def test_blog_inline_image_follows_caption_edit(client, tmp_path, settings):
+    settings.MEDIA_ROOT = tmp_path
+    post = BlogPost.objects.create(
+        title="Встроенные изображения",
+        slug="blog-inline-image-cache-test",
+        excerpt="Описание",
+        content_html="<h2>Первый раздел</h2><p>Текст</p><h2>Второй раздел</h2>",
+        is_published=True,
+        published_at=timezone.now(),
+    )
+    image = BlogPostImage.objects.create(
+        post=post,
+        image=SimpleUploadedFile("one.jpg", b"file1", content_type="image/jpeg"),
+        caption="@after: Первый раздел | Подпись",
+    )
+
+    content = client.get(post.get_absolute_url()).content.decode("utf-8")
+    assert "<figcaption>Подпись</figcaption>" in content
+
+    # Editing only the image (post.updated_at unchanged) must not serve stale HTML
+    image.caption = "@after: Второй раздел | Новая подпись"
+    image.save()
+    content = client.get(post.get_absolute_url()).content.decode("utf-8")
+    assert "<figcaption>Новая подпись</figcaption>" in content
+    assert "<figcaption>Подпись</figcaption>" not in content
+
+
+def test_blog_detail_image_queries_do_not_grow_per_image(client, tmp_path, settings):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    settings.MEDIA_ROOT = tmp_path
+    counts = []
+    for count in (1, 4):
+        post = BlogPost.objects.create(
+            title=f"Галерея {count}",
+            slug=f"blog-gallery-queries-{count}",
+            excerpt="Описание",
+            content_html="<h2>Раздел</h2><p>Контент</p>",
+            is_published=True,
+            published_at=timezone.now(),
+        )
+        for index in range(count):
+            BlogPostImage.objects.create(
+                post=post,
+                image=SimpleUploadedFile(f"q{count}_{index}.jpg", b"file", content_type="image/jpeg"),
+                caption="@after: Раздел" if index % 2 else "",
+                sort_order=index,
+            )
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(post.get_absolute_url()).status_code == 200
+        counts.append(len(queries))
+
+    assert counts[0] == counts[1]
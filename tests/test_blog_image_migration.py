@@ -638,3 +638,14 @@ def test_move_images_dry_run_does_not_modify(client):
     assert post.content_html == original_content
     assert post.images.count() == original_image_count
     assert BlogPostImage.objects.filter(id__in=[img2.id, img3.id, img4.id]).count() == 3
+
+
+def test_walk_blocks_handles_nested_and_unclosed_tags():
+    """Block walk should pair tags via a stack, skipping <pre> and unclosed tags."""
+    from blog.management.commands.move_images_to_content import _walk_blocks
+
+    html = '<h2>Title <p>unclosed</h2><pre>code</pre><p class="x">One &amp; <b>two</b></p>'
+    assert _walk_blocks(html) == (
+        ("h2", "Title unclosed", "title unclosed", 0),
+        ("p", "One & two", "one & two", html.index('<p class="x">')),
+    )
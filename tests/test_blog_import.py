@@ -101,3 +101,59 @@ def test_explicit_slug_respected(capsys):
     finally:
         if test_path.exists():
             test_path.unlink()
+
+
+def test_xml_paragraph_reader_matches_python_docx(tmp_path):
+    import docx
+
+    from blog.management.commands.import_blog_content import (
+        _read_paragraphs_docx,
+        _read_paragraphs_xml,
+    )
+
+    path = tmp_path / "reader.docx"
+    doc = docx.Document()
+    doc.add_heading("Заголовок статьи", level=1)
+    doc.add_paragraph("Первый абзац\tс табуляцией.")
+    doc.add_paragraph("Пункт списка", style="List Bullet")
+    doc.add_paragraph("   ")
+    table = doc.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = "Текст в таблице"
+    doc.add_heading("Подзаголовок", level=3)
+    doc.save(str(path))
+
+    paragraphs = _read_paragraphs_xml(path)
+    assert paragraphs == _read_paragraphs_docx(path)
+    assert paragraphs[0] == ("Heading 1", "Заголовок статьи")
+
+
+def test_reimport_restores_changed_fields():
+    posts, _, data = _import_posts(include_all=True)
+    post = posts.first()
+    original = BlogPost.objects.get(pk=post.pk)
+    BlogPost.objects.filter(pk=post.pk).update(excerpt="changed", is_published=False)
+
+    call_command("import_blog_content", "--all")
+
+    post.refresh_from_db()
+    assert post.excerpt == original.excerpt
+    assert post.is_published is True
+    assert post.updated_at >= original.updated_at
+
+
+def test_parallel_parse_matches_sequential():
+    from blog.management.commands.import_blog_content import parse_docx_files
+
+    files, _ = get_source_files(include_all=True)
+    assert parse_docx_files(files, jobs=2) == [parse_docx_file(path) for path in files]
+
+
+def test_import_parses_in_process_by_default(monkeypatch):
+    from blog.management.commands import import_blog_content
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("worker pool created without --jobs")
+
+    monkeypatch.setattr(import_blog_content, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(import_blog_content.os, "cpu_count", lambda: 8)
+    call_command("import_blog_content", "--dry-run", "--all")
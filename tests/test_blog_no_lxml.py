@@ -73,3 +73,12 @@ def test_inject_images_stdlib_no_match_returns_unchanged(monkeypatch):
 
     assert used == []
     assert out == html
+
+
+def test_find_headings_stdio_uppercase_and_unclosed():
+    """Uppercase tags match case-insensitively; an unclosed heading is skipped."""
+    from blog import views
+
+    html = '<H2 class="x">Foo <b>bar</b></H2><p>Text</p><h3>Unclosed<p>More</p>'
+
+    assert views._find_headings_stdio(html) == [(html.index("<p>"), "Foo bar")]
@@ -1,3 +1,4 @@
+import os
 import re
 
 import pytest
@@ -42,3 +43,27 @@ def test_build_id_footer_consistent(client):
         build_values.append(match.group(1))
     assert len(set(build_values)) == 1
     assert build_values[0] == get_build_id()
+
+
+def test_build_id_file_rechecked_after_interval(tmp_path, monkeypatch):
+    from carfst_site import build_id
+
+    build_file = tmp_path / "BUILD_ID"
+    build_file.write_text("2026-01-01_1", encoding="utf-8")
+    now = [1000.0]
+    monkeypatch.setattr(build_id.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(build_id, "_BUILD_ID_FILE", build_file)
+    monkeypatch.setattr(build_id, "_CACHED_BUILD_ID", None)
+    monkeypatch.setattr(build_id, "_CACHED_MTIME", None)
+    monkeypatch.setattr(build_id, "_RESOLVED_BUILD_ID", None)
+    monkeypatch.setattr(build_id, "_LAST_CHECK", 0.0)
+
+    assert build_id.get_build_id() == "2026-01-01_1"
+
+    build_file.write_text("2026-01-02_1", encoding="utf-8")
+    os.utime(build_file, (2_000_000_000, 2_000_000_000))
+    now[0] += 30
+    assert build_id.get_build_id() == "2026-01-01_1"
+
+    now[0] += build_id._RECHECK_SECONDS
+    assert build_id.get_build_id() == "2026-01-02_1"
@@ -26,3 +26,33 @@ def test_canonical_host_allows_request(settings, rf, middleware):
     response = middleware(request)
 
     assert response.status_code == 200
+
+
+def test_safe_path_keeps_host_matching_suffix_pattern(settings, rf):
+    settings.ALLOWED_HOSTS = [".carfst.ru"]
+    middleware = CanonicalHostMiddleware(lambda request: HttpResponse("ok"))
+    allowed = rf.get("/sitemap.xml/", HTTP_HOST="m.carfst.ru")
+    unknown = rf.get("/robots.txt", HTTP_HOST="bad.host")
+
+    middleware(allowed)
+    middleware(unknown)
+
+    assert allowed.META["HTTP_HOST"] == "m.carfst.ru"
+    assert unknown.META["HTTP_HOST"] == "carfst.ru"
+
+
+def test_www_redirects_to_canonical_host(settings, rf, middleware):
+    request = rf.get("/catalog/?page=2", HTTP_HOST="www.carfst.ru", secure=True)
+
+    response = middleware(request)
+
+    assert response.status_code == 301
+    assert response["Location"] == "https://carfst.ru/catalog/?page=2"
+
+
+def test_canonical_host_with_malformed_port_returns_bad_request(rf, middleware):
+    request = rf.get("/", HTTP_HOST="carfst.ru:abc")
+
+    response = middleware(request)
+
+    assert response.status_code == 400
@@ -56,6 +56,43 @@ def test_health_view_degraded_when_static_missing(client, tmp_path, settings):
     assert "static" in data["checks"]["static_root"]["detail"]
 
 
+def test_static_root_empty_directory_warns(tmp_path, settings):
+    settings.STATIC_ROOT = tmp_path
+
+    assert health._check_static_root() == "STATIC_ROOT is empty; run collectstatic."
+
+    (tmp_path / "app.css").write_text("body{}", encoding="utf-8")
+    assert health._check_static_root() is None
+
+
+def test_cache_check_probe_add_and_readback():
+    cache = caches["default"]
+    cache.delete("healthcheck_ping")
+
+    assert health._check_cache() is None  # inserted via add()
+    assert health._check_cache() is None  # probe still cached: read back
+
+    cache.set("healthcheck_ping", "stale", timeout=5)
+    assert health._check_cache() == "Cache read/write validation failed."
+    cache.delete("healthcheck_ping")
+
+
+def test_directory_checks_report_missing_and_non_directory(tmp_path, settings):
+    not_a_dir = tmp_path / "file.txt"
+    not_a_dir.write_text("x", encoding="utf-8")
+
+    settings.MEDIA_ROOT = tmp_path / "missing"
+    settings.LOG_DIR = not_a_dir
+    settings.STATIC_ROOT = tmp_path / "missing"
+
+    assert health._check_media_root() == "MEDIA_ROOT is missing."
+    assert health._check_log_dir() == "LOG_DIR is not a directory."
+    assert health._check_static_root() == "STATIC_ROOT is missing; run collectstatic."
+
+    settings.MEDIA_ROOT = tmp_path
+    assert health._check_media_root() is None
+
+
 def test_health_view_strict_mode_degraded_returns_503(client, tmp_path, settings):
     """Strict mode (?strict=1) should return 503 for degraded status."""
     static_root = tmp_path / "staticfiles"
@@ -95,6 +132,40 @@ def test_database_failure_skips_followup_checks(monkeypatch):
     assert report["checks"]["orphaned_media"]["status"] == "skipped"
 
 
+def test_slug_duplicates_single_query(django_assert_num_queries):
+    from tests.factories import ProductFactory
+
+    ProductFactory.create_batch(2)
+
+    with django_assert_num_queries(1):
+        duplicates = health._check_slug_duplicates()
+
+    assert duplicates == {}
+
+
+def test_unapplied_migrations_plan_reused_until_table_changes(monkeypatch):
+    from django.db.migrations.recorder import MigrationRecorder
+
+    monkeypatch.setattr(health, "_migrations_check_cache", None)
+    executors = []
+    real_executor = health.MigrationExecutor
+
+    def counting_executor(connection):
+        executors.append(1)
+        return real_executor(connection)
+
+    monkeypatch.setattr(health, "MigrationExecutor", counting_executor)
+
+    assert health._check_unapplied_migrations() == []
+    assert health._check_unapplied_migrations() == []
+    assert len(executors) == 1
+
+    MigrationRecorder.Migration.objects.filter(app="blog").order_by("-id").first().delete()
+    unapplied = health._check_unapplied_migrations()
+    assert len(executors) == 2
+    assert len(unapplied) == 1 and unapplied[0].startswith("blog.")
+
+
 def test_health_orphaned_media_skipped_by_default(client, tmp_path, settings):
     """Without deep=1 or HEALTH_ORPHANED_MEDIA=1, orphaned_media is skipped and scan is not run."""
     static_root = tmp_path / "staticfiles"
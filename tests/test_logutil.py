@@ -0,0 +1,38 @@
+import copy
+import logging
+import logging.config
+
+from carfst_site import health
+from carfst_site.logutil import MkdirRotatingFileHandler
+from django.conf import settings as django_settings
+
+
+def test_file_handler_creates_log_dir_on_construction(settings, tmp_path):
+    log_dir = tmp_path / "fresh" / "logs"
+    settings.LOG_DIR = log_dir
+
+    handler = MkdirRotatingFileHandler(log_dir / "django.log", delay=True)
+    try:
+        assert log_dir.is_dir()
+        assert not (log_dir / "django.log").exists()
+        assert health._check_log_dir() is None
+    finally:
+        handler.close()
+
+
+def test_logging_settings_apply_with_file_handlers(tmp_path):
+    assert django_settings.LOG_TO_FILE
+    config = copy.deepcopy(django_settings.LOGGING)
+    config["handlers"]["django_file"]["filename"] = str(tmp_path / "django.log")
+    config["handlers"]["error_file"]["filename"] = str(tmp_path / "errors.log")
+
+    try:
+        logging.config.dictConfig(config)
+        logging.getLogger("request_errors").error("boom")
+        for handler in logging.getLogger("request_errors").handlers:
+            handler.close()
+    finally:
+        logging.config.dictConfig(django_settings.LOGGING)
+
+    content = (tmp_path / "errors.log").read_text(encoding="utf-8")
+    assert "[ERROR] request_errors: boom" in content
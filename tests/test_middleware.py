@@ -1,8 +1,19 @@
+import asyncio
+import logging
+
 import pytest
+from asgiref.sync import iscoroutinefunction
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory
+from django.utils.functional import SimpleLazyObject
 
-from carfst_site.middleware import UploadValidationMiddleware
+from carfst_site.middleware import (
+    ErrorLoggingMiddleware,
+    ResponseDecoratorMiddleware,
+    TemplateArtifactCleanupMiddleware,
+    UploadValidationMiddleware,
+)
 
 
 @pytest.fixture
@@ -63,3 +74,117 @@ def test_rejects_disallowed_content_type(rf, middleware, settings):
 
     assert response.status_code == 400
     assert "content type" in response.content.decode()
+
+
+def test_skips_non_multipart_body(rf, middleware, settings):
+    settings.MAX_IMAGE_SIZE = 1
+
+    request = rf.post("/api", data=b'{"file": "x"}', content_type="application/json")
+
+    response = middleware(request)
+
+    assert response.status_code == 200
+    assert not hasattr(request, "_files")
+
+
+def test_artifact_cleanup_keeps_line_after_hash_marker(rf):
+    html = (
+        "<html><body>\n"
+        "{# note #}\n"
+        "#####\n"
+        "<h3>Title</h3>\n"
+        "### Heading\n"
+        "<p>Text</p>\n"
+        "Inline SVG placeholder for cases when product has no images\n"
+        "</body></html>"
+    )
+    middleware = TemplateArtifactCleanupMiddleware(
+        lambda request: HttpResponse(html, content_type="text/html")
+    )
+
+    content = middleware(rf.get("/")).content.decode()
+
+    assert "<h3>Title</h3>" in content
+    assert "<p>Text</p>" in content
+    assert "#" not in content
+    assert "note" not in content
+    assert "placeholder" not in content
+
+
+def test_artifact_cleanup_updates_content_length_set_by_view(rf):
+    response = HttpResponse("<p>{# note #}text</p>", content_type="text/html")
+    response["Content-Length"] = str(len(response.content))
+    middleware = TemplateArtifactCleanupMiddleware(lambda request: response)
+
+    result = middleware(rf.get("/"))
+
+    assert result.content == b"<p>text</p>"
+    assert result["Content-Length"] == str(len(b"<p>text</p>"))
+
+
+def test_artifact_cleanup_leaves_markers_inside_script_untouched(rf):
+    html = "<html>\n  <script>// ### keep</script>\n  <p>a  b</p>\n</html>"
+    response = HttpResponse(html, content_type="text/html")
+    middleware = TemplateArtifactCleanupMiddleware(lambda request: response)
+
+    assert middleware(rf.get("/")).content.decode() == html
+
+
+def test_artifact_cleanup_skips_streaming_response(rf):
+    response = StreamingHttpResponse(iter([b"### a", b"b"]), content_type="text/html")
+    middleware = TemplateArtifactCleanupMiddleware(lambda request: response)
+
+    result = middleware(rf.get("/"))
+
+    assert b"".join(result.streaming_content) == b"### ab"
+
+
+@pytest.mark.parametrize(
+    "path, noindex, no_store",
+    [
+        ("/", False, False),
+        ("/lead/", True, False),
+        ("/staff/orders/", True, True),
+        ("/adminlogin/", True, True),
+    ],
+)
+def test_response_decorator_headers(rf, path, noindex, no_store):
+    middleware = ResponseDecoratorMiddleware(lambda request: HttpResponse("ok"))
+
+    response = middleware(rf.get(path))
+
+    assert response["X-Build-ID"]
+    assert "camera=()" in response["Permissions-Policy"]
+    assert (response.get("X-Robots-Tag") == "noindex, nofollow") is noindex
+    assert ("no-store" in response.get("Cache-Control", "")) is no_store
+
+
+def test_response_decorator_runs_natively_under_async():
+    async def view(request):
+        return HttpResponse("ok")
+
+    middleware = ResponseDecoratorMiddleware(view)
+
+    response = asyncio.run(middleware(AsyncRequestFactory().get("/lead/")))
+
+    assert iscoroutinefunction(middleware)
+    assert response["X-Robots-Tag"] == "noindex, nofollow"
+
+
+def test_error_logging_does_not_load_lazy_user(rf, caplog):
+    def load_user():
+        raise AssertionError("user should not be loaded for logging")
+
+    middleware = ErrorLoggingMiddleware(lambda request: HttpResponse(status=502))
+    request = rf.get("/")
+    request.user = SimpleLazyObject(load_user)
+
+    logger = logging.getLogger("request_errors")
+    logger.addHandler(caplog.handler)
+    try:
+        response = middleware(request)
+    finally:
+        logger.removeHandler(caplog.handler)
+
+    assert response["X-Request-ID"]
+    assert caplog.records[-1].user_id is None